@@ -9,6 +9,7 @@ from pages.drawing_issuance import DrawingIssuancePage
 from pages.placeholders import ReturnPage, ReportsPage
 from pages.users_page import UsersPage
 import styles
+import tracing
 
 # Page permission mapping: ID -> Page Key
 # These IDs should be stored in access_tokens JSON field in drawing_users table
@@ -127,23 +128,27 @@ class MainApp(ttk.Frame):
         if page_key not in allowed_pages:
             messagebox.showwarning("Access Denied", "You don't have permission to access this page.")
             return
-            
+
+        # Ends at the first frame painted once the page's data is in
+        trace = tracing.tracer.start("show_page", page=page_key)
+
         # Hide current page if exists
         if self.current_page:
             self.current_page.pack_forget()
 
         # Get or create page
         if page_key not in self.pages:
-            if page_key == "Drawing Requests":
-                self.pages[page_key] = DrawingRequestsPage(self.content_frame, self.username)
-            elif page_key == "Drawing Issuance":
-                self.pages[page_key] = DrawingIssuancePage(self.content_frame, self.username)
-            elif page_key == "Return":
-                self.pages[page_key] = ReturnPage(self.content_frame)
-            elif page_key == "Reports":
-                self.pages[page_key] = ReportsPage(self.content_frame)
-            elif page_key == "User Management":
-                self.pages[page_key] = UsersPage(self.content_frame)
+            with trace.span("build"):
+                if page_key == "Drawing Requests":
+                    self.pages[page_key] = DrawingRequestsPage(self.content_frame, self.username)
+                elif page_key == "Drawing Issuance":
+                    self.pages[page_key] = DrawingIssuancePage(self.content_frame, self.username)
+                elif page_key == "Return":
+                    self.pages[page_key] = ReturnPage(self.content_frame)
+                elif page_key == "Reports":
+                    self.pages[page_key] = ReportsPage(self.content_frame)
+                elif page_key == "User Management":
+                    self.pages[page_key] = UsersPage(self.content_frame)
         
         # Show page first so user sees the layout
         self.current_page = self.pages.get(page_key)
@@ -152,4 +157,6 @@ class MainApp(ttk.Frame):
             # Refresh data in background if the page supports it
             if hasattr(self.current_page, 'refresh'):
                 self.current_page.refresh()
+        # Pages without a table to paint end the trace once Tk goes idle
+        self.after_idle(trace.frame_painted)
 
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless benchmarks for CanvasDataTable.
+
+Builds a table on synthetic drawing records (1k to 1M rows), drives it the
+way a user would - full redraw, typing in the search box, page turns, a
+hover sweep over the visible rows and a column drag - and reports for each
+operation the wall time per step, the canvas items created and the peak
+Python memory. Results are compared against a stored baseline and any
+regression is flagged (exit status 1).
+
+    python benchmarks/bench_table.py                      # compare with baseline
+    python benchmarks/bench_table.py --save-baseline      # record a new one
+    python benchmarks/bench_table.py --sizes 1000,10000 --virtual
+
+Without a DISPLAY, the table runs on an Xvfb server started for the run.
+Baselines only mean something on the machine that recorded them.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+STATUSES = ["Approved", "Requested", "Issued", "Returned", "Rejected"]
+NAMES = ["John Doe", "Jane Smith", "Robert Brown", "Sarah Wilson", "Michael Scott", ""]
+
+def start_display():
+    """Starts Xvfb on a free display number if there is no DISPLAY; returns the process."""
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("No DISPLAY and Xvfb is not installed")
+    for num in range(99, 120):
+        if os.path.exists("/tmp/.X%d-lock" % num):
+            continue
+        proc = subprocess.Popen(["Xvfb", ":%d" % num, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(0.5)
+        if proc.poll() is None:
+            os.environ["DISPLAY"] = ":%d" % num
+            return proc
+    sys.exit("Could not start Xvfb")
+
+def make_records(n, seed=42):
+    rnd = random.Random(seed)
+    return [{"no": "MDI-DRW-%07d" % i,
+             "rev": "%s.%d" % (rnd.choice("ABC"), rnd.randint(0, 9)),
+             "status": rnd.choice(STATUSES),
+             "requested_by": rnd.choice(NAMES)}
+            for i in range(n)]
+
+class Bench(object):
+    """One table instance plus the helpers to drive it and wait for the paint."""
+    def __init__(self, root, virtual_scroll=False):
+        from pages.table_component import CanvasDataTable
+        self.root = root
+        self.table = CanvasDataTable(
+            root,
+            title="Benchmark",
+            headers=["Drawing ID", "Revision", "Status", "Requested By", "Actions"],
+            initial_widths=[180, 90, 130, 280, 200],
+            get_action_buttons_func=self._get_actions,
+            search_keys=["no", "rev", "status", "requested_by"],
+            cell_formatters={
+                2: lambda v, r: (str(v).upper(), "#1f2937", ("Segoe UI", 10), "center"),
+                3: lambda v, r: (v, "#4f46e5", ("Segoe UI", 9, "italic"), "w")
+            },
+            virtual_scroll=virtual_scroll,
+            frame_budget_ms=0,
+            search_delay_ms=0
+        )
+        self.table.data_keys = ["no", "rev", "status", "requested_by"]
+        self.table.pack(expand=True, fill="both")
+        self.settle()
+
+    def _get_actions(self, record):
+        if record.get("requested_by"):
+            return [("Issue", "#10b981", "white", None), ("Reject", "#ef4444", "white", None)]
+        return [("Request", "#3b82f6", "white", None)]
+
+    def settle(self, trace=None, timeout=120):
+        """Runs the event loop until trace (if any) has ended and nothing is left to paint."""
+        deadline = time.time() + timeout
+        while True:
+            self.root.update()
+            if (trace is None or trace.done) and self.table._redraw_id is None:
+                return
+            if time.time() > deadline:
+                raise RuntimeError("timed out waiting for the table to settle")
+            time.sleep(0.0005)
+
+    def last_item(self):
+        """Id of a freshly created canvas item; ids only ever grow."""
+        canvas = self.table.canvas
+        item = canvas.create_line(0, 0, 0, 0)
+        canvas.delete(item)
+        return item
+
+    # Operations: each returns the number of steps it performed
+
+    def op_load(self, records):
+        self.table._on_data_ready(records)
+        self.settle()
+        return 1
+
+    def op_redraw(self):
+        self.table._redraw_table()
+        self.root.update_idletasks()
+        return 1
+
+    def op_search(self, query="drw-00012"):
+        import tracing
+        for i in range(1, len(query) + 1):
+            self.table.search_var.set(query[:i])
+            self.settle(tracing.tracer.current())
+        steps = len(query)
+        self.table.search_var.set("")
+        self.settle(tracing.tracer.current())
+        return steps + 1
+
+    def op_page(self, turns=20):
+        import tracing
+        steps = 0
+        for _ in range(turns):
+            self.table._next_page()
+            self.settle(tracing.tracer.current())
+            steps += 1
+        while self.table.current_page > 0 and not self.table.virtual_scroll:
+            self.table._prev_page()
+            self.settle(tracing.tracer.current())
+            steps += 1
+        return steps
+
+    def op_hover(self):
+        table = self.table
+        height = table.canvas.winfo_height()
+        steps = 0
+        for y in range(table.header_height + 5, height, table.row_height // 2):
+            x = 5
+            for w in table.col_widths:
+                for dx in (w // 4, w // 2, 3 * w // 4):
+                    table._on_canvas_motion(_Event(x + dx, y))
+                    self.settle()
+                    steps += 1
+                x += w
+        table._on_canvas_leave(_Event(0, 0))
+        self.settle()
+        return steps
+
+    def op_drag(self, distance=120):
+        table = self.table
+        x = table.col_widths[0]
+        y = table.header_height // 2
+        table._on_canvas_click(_Event(x, y))
+        steps = 0
+        for dx in list(range(1, distance + 1)) + list(range(distance, -1, -1)):
+            table._on_resize_drag(_Event(x + dx, y))
+            self.settle()
+            steps += 1
+        table._on_resize_release(_Event(x, y))
+        return steps
+
+class _Event(object):
+    def __init__(self, x, y, state=0):
+        self.x = x
+        self.y = y
+        self.state = state
+
+OPS = ["redraw", "search", "page", "hover", "drag"]
+
+def measure(bench, op, repeat, *args):
+    """Median ms per step over repeat runs, canvas items created over all runs, peak KB of one run."""
+    fn = getattr(bench, "op_" + op)
+    first = bench.last_item()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        steps = fn(*args)
+        times.append((time.perf_counter() - start) * 1000 / max(1, steps))
+    items = bench.last_item() - first - 1
+
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ms": round(statistics.median(times), 3), "items": items,
+            "peak_kb": round(peak / 1024.0, 1)}
+
+def run(sizes, repeat, virtual_scroll):
+    import tkinter as tk
+    import styles
+    import tracing
+    tracing.tracer.path = None  # keep traces in memory, they are only used to wait
+
+    results = {}
+    for n in sizes:
+        root = tk.Tk()
+        root.geometry("1000x700")
+        styles.apply_styles()
+        bench = Bench(root, virtual_scroll)
+        records = make_records(n)
+
+        # Loading happens once; its peak memory includes the store and indexes
+        first = bench.last_item()
+        tracemalloc.start()
+        start = time.perf_counter()
+        bench.op_load(records)
+        load_ms = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results["%d/load" % n] = {"ms": round(load_ms, 3),
+                                  "items": bench.last_item() - first - 1,
+                                  "peak_kb": round(peak / 1024.0, 1)}
+        del records
+
+        for op in OPS:
+            results["%d/%s" % (n, op)] = measure(bench, op, repeat)
+            print("  %-14s %s" % ("%d/%s" % (n, op), results["%d/%s" % (n, op)]))
+        root.destroy()
+    return results
+
+def compare(results, baseline, tolerance):
+    """Returns [(key, message)] for results worse than the baseline."""
+    flags = []
+    for key, cur in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if cur["ms"] > base["ms"] * (1 + tolerance) and cur["ms"] - base["ms"] > 0.05:
+            flags.append((key, "time %.3f ms -> %.3f ms" % (base["ms"], cur["ms"])))
+        if cur["items"] > base["items"]:
+            flags.append((key, "items %d -> %d" % (base["items"], cur["items"])))
+        if cur["peak_kb"] > base["peak_kb"] * (1 + tolerance) and cur["peak_kb"] - base["peak_kb"] > 64:
+            flags.append((key, "peak %.1f KB -> %.1f KB" % (base["peak_kb"], cur["peak_kb"])))
+    return flags
+
+def print_report(results, baseline):
+    print("")
+    print("%-16s %12s %10s %12s %12s" % ("benchmark", "ms/step", "items", "peak KB", "baseline ms"))
+    for key in sorted(results, key=lambda k: (int(k.split("/")[0]), k)):
+        cur = results[key]
+        base = baseline.get(key)
+        print("%-16s %12.3f %10d %12.1f %12s" % (key, cur["ms"], cur["items"], cur["peak_kb"],
+                                                "%.3f" % base["ms"] if base else "-"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CanvasDataTable rendering.")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per operation")
+    parser.add_argument("--virtual", action="store_true", help="use virtual scrolling")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown/growth before flagging (0.25 = 25%%)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    mode = "virtual" if args.virtual else "paged"
+
+    display = start_display()
+    try:
+        results = run(sizes, args.repeat, args.virtual)
+    finally:
+        if display is not None:
+            display.terminate()
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    baseline = stored.get(mode, {})
+
+    print_report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({mode: results}, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        stored.setdefault(mode, {}).update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print("\nBaseline saved to %s" % args.baseline)
+        return 0
+
+    flags = compare(results, baseline, args.tolerance)
+    if not baseline:
+        print("\nNo %s baseline in %s; run with --save-baseline to record one." % (mode, args.baseline))
+    elif flags:
+        print("\nRegressions (tolerance %d%%):" % (args.tolerance * 100))
+        for key, message in flags:
+            print("  %-16s %s" % (key, message))
+        return 1
+    else:
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,8 +3,661 @@
 
 import pymysql
 import pymysql.cursors
+import bisect
+import logging
+import logging.handlers
+import os
+import re
 import sys
 import threading
+import time
+from collections import deque, OrderedDict
+from itertools import islice
+import tracing
+
+def _statement(query, limit=80):
+    """Query text for traces: whitespace collapsed and cut short."""
+    return " ".join(query.split())[:limit]
+
+_NAME = r"`?(\w+)`?(?:\.`?(\w+)`?)?"
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_READ_TABLE = re.compile(r"\b(?:FROM|JOIN|STRAIGHT_JOIN)\s+(?:(\()|" + _NAME + ")", re.IGNORECASE)
+_FROM_TOKENS = re.compile(r"[(),]|\b(?:WHERE|GROUP|HAVING|ORDER|LIMIT|UNION|FOR|LOCK|WINDOW|INTO)\b",
+                          re.IGNORECASE)
+_MODIFIERS = r"(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|QUICK|IGNORE)\s+)*"
+# The single-table write forms; anything else (multi-table UPDATE/DELETE,
+# DDL...) can't be attributed to one table
+_WRITE_FORMS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"^(?:INSERT|REPLACE)\s+" + _MODIFIERS + r"(?:INTO\s+)?" + _NAME + r"\s*(?:\(|VALUES?\b|SET\b|SELECT\b)",
+    r"^UPDATE\s+" + _MODIFIERS + _NAME + r"\s+SET\b",
+    r"^DELETE\s+" + _MODIFIERS + r"FROM\s+" + _NAME + r"\s*(?:WHERE\b|ORDER\b|LIMIT\b|$)",
+    r"^TRUNCATE\s+(?:TABLE\s+)?" + _NAME + r"\s*$",
+)]
+
+def _table(schema, name):
+    # db.table -> table: this handler only ever talks to one schema
+    return (name or schema).lower()
+
+def _comma_join(text, pos):
+    """True if the FROM clause starting at pos lists tables with commas."""
+    depth = 0
+    for match in _FROM_TOKENS.finditer(text, pos):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+            if depth < 0:  # end of the subquery this FROM belongs to
+                return False
+        elif depth == 0:
+            return token == ","  # or a keyword ending the table list
+    return False
+
+def read_tables(query):
+    """
+    Tables a SELECT reads (FROM and JOIN clauses), lower-cased, or None if
+    that can't be told reliably (comma joins, parenthesized joins, other
+    statements, locking reads); such results must not be cached.
+    """
+    text = _STRINGS.sub("?", " ".join(query.split()))
+    if not re.match(r"SELECT\b", text, re.IGNORECASE) or re.search(
+            r"\bFOR\s+UPDATE\b|\bLOCK\s+IN\b", text, re.IGNORECASE):
+        return None
+    tables = set()
+    for match in _READ_TABLE.finditer(text):
+        paren, schema, name = match.groups()
+        if paren:
+            # FROM (SELECT ...) is fine, its own FROM is matched too; FROM (a JOIN b) isn't
+            if not re.match(r"\s*SELECT\b", text[match.end():], re.IGNORECASE):
+                return None
+        else:
+            tables.add(_table(schema, name))
+        is_from = match.group(0)[:4].upper() == "FROM"
+        if is_from and _comma_join(text, match.start(1) if paren else match.end()):
+            return None
+    return tables or None
+
+def write_table(query):
+    """Table an INSERT/REPLACE/UPDATE/DELETE writes, or None if it can't be told."""
+    text = " ".join(query.split())
+    for form in _WRITE_FORMS:
+        match = form.match(text)
+        if match:
+            return _table(*match.groups())
+    return None
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b|%s")
+_TUPLES = re.compile(r"(\([?, ]+\))(?:\s*,\s*\([?, ]+\))+")
+_IN_LIST = re.compile(r"\bIN\s*\([?, ]+\)", re.IGNORECASE)
+
+def query_shape(query):
+    """
+    The statement with literals and placeholders replaced by ?, and
+    multi-row VALUES and IN lists collapsed, so queries that differ only in
+    their values (or batch size) are counted together.
+    """
+    shape = _LITERALS.sub("?", " ".join(query.split()))
+    shape = _TUPLES.sub(r"\1, ...", shape)
+    return _IN_LIST.sub("IN (...)", shape)
+
+def _payload_bytes(rows):
+    """
+    Approximate size of a result: text and binary values by length, others
+    as 8 bytes. A row that is neither a dict nor a sequence (e.g. a single
+    scalar param) counts as one value.
+    """
+    total = 0
+    for row in rows:
+        if isinstance(row, dict):
+            values = row.values()
+        elif isinstance(row, (list, tuple)):
+            values = row
+        else:
+            values = (row,)
+        for value in values:
+            total += len(value) if isinstance(value, (str, bytes, bytearray)) else 8
+    return total
+
+def _env_float(name, default):
+    """os.environ[name] as a float; default if it is unset or not a number."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print("Warning: ignoring {}={!r}, not a number; using {}".format(name, value, default))
+        return default
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool(object):
+    """
+    A bounded pool of connections made by connect(). Each checkout leases a
+    connection to one thread until it is released; callers beyond max_size
+    wait up to wait_timeout seconds for one to come back.
+
+    On checkout, connections idle longer than max_idle are closed and ones
+    idle longer than ping_after are pinged first, so a connection the server
+    dropped is replaced instead of failing the query.
+    """
+    def __init__(self, connect, max_size=6, max_idle=300, ping_after=10, wait_timeout=15):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.wait_timeout = wait_timeout
+        self._idle = deque()    # (conn, released_at), most recent on the right
+        self._leases = {}       # id(conn) -> (thread name, leased_at)
+        self._size = 0          # open connections, idle or leased
+        self._closed = False    # set by close_all(); released connections are closed
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "waits": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                       "timeouts": 0, "created": 0, "expired": 0, "discarded": 0}
+
+    def acquire(self):
+        """Leases a connection; raises PoolTimeout or the connect error."""
+        start = time.monotonic()
+        waited = False
+        while True:
+            conn = None
+            with self._cond:
+                self._expire_idle()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = self.wait_timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout("no connection free after %gs (%d leased)"
+                                          % (self.wait_timeout, len(self._leases)))
+                    waited = True
+                    self._cond.wait(remaining)
+                    self._expire_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                else:
+                    self._size += 1  # reserve the slot, connect outside the lock
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["created"] += 1
+            elif not self._healthy(conn, released_at):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                wait_ms = (time.monotonic() - start) * 1000
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                self._stats["wait_ms_total"] += wait_ms
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+                self._leases[id(conn)] = (threading.current_thread().name, time.monotonic())
+            return conn
+
+    def release(self, conn, broken=False):
+        """
+        Returns a leased connection; broken ones, and all of them once the
+        pool is closed, are closed instead. Connections this pool didn't
+        lease, or already got back, are ignored.
+        """
+        with self._cond:
+            if self._leases.pop(id(conn), None) is None:
+                print("Ignoring release of a connection the pool has not leased")
+                return
+            closed = self._closed
+        if broken or closed or not conn.open:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _healthy(self, conn, released_at):
+        if not conn.open:
+            return False
+        if time.monotonic() - released_at < self.ping_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except pymysql.Error:
+            return False
+
+    def _expire_idle(self):
+        # Called with the lock held; the oldest idle connections are on the left
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["expired"] += 1
+            self._close(conn)
+
+    def _discard(self, conn):
+        with self._cond:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+        self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """
+        Closes the idle connections and stops pooling: leased ones, and any
+        leased after this, are closed when released.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Pool size and checkout/wait counters, for diagnostics."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(size=self._size, idle=len(self._idle), leased=len(self._leases),
+                         max_size=self.max_size)
+            now = time.monotonic()
+            stats["leases"] = [(name, round(now - since, 3))
+                               for name, since in self._leases.values()]
+        checkouts = stats["checkouts"]
+        stats["wait_ms_avg"] = stats["wait_ms_total"] / checkouts if checkouts else 0.0
+        return stats
+
+def _freeze(value):
+    # Lists (e.g. for "IN %s") and dicts as hashable tuples
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+class QueryCache(object):
+    """
+    Results of read queries, keyed by statement (whitespace collapsed) and
+    params, for ttl seconds and at most max_entries of them, least recently
+    used evicted first. Each entry is tagged with the tables it read, so a
+    write to one of them evicts it.
+
+    A result computed while a write was in flight is not stored: callers
+    take epoch() before querying and hand it to put(), which drops the
+    result if any invalidation happened in between.
+    """
+    def __init__(self, ttl=60, max_entries=256, max_rows=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (rows, expires_at, tables)
+        self._by_table = {}            # table -> set of keys
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(query, params):
+        """Cache key for query and params, or None if params can't be hashed."""
+        key = (" ".join(query.split()), _freeze(params) if params else None)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def epoch(self):
+        return self._epoch
+
+    def get(self, key):
+        """Copies of the cached rows, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        # Callers decorate the rows they get (row hooks, JSON decoding)
+        return [dict(row) for row in entry[0]]
+
+    def put(self, key, rows, tables, epoch, ttl=None):
+        if not tables or len(rows) > self.max_rows:
+            return
+        rows = [dict(row) for row in rows]
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._drop(key)
+            self._entries[key] = (rows, expires, tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        # Called with the lock held
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[2]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate(self, *tables):
+        """Evicts entries reading any of tables, or everything if none are given."""
+        with self._lock:
+            self._epoch += 1
+            if not tables:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._by_table.clear()
+            else:
+                keys = set()
+                for table in tables:
+                    keys.update(self._by_table.get(table.lower(), ()))
+                for key in keys:
+                    self._drop(key)
+                dropped = len(keys)
+            self._stats["invalidations"] += dropped
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(entries=len(self._entries), tables=sorted(self._by_table))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / float(lookups) if lookups else 0.0
+        return stats
+
+class _ShapeStats(object):
+    __slots__ = ("calls", "errors", "cache_hits", "rows", "bytes", "total_ms", "max_ms",
+                 "histogram", "recent")
+
+    def __init__(self, buckets, keep):
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.rows = 0
+        self.bytes = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(buckets) + 1)
+        self.recent = deque(maxlen=keep)
+
+class QueryStats(object):
+    """
+    Latency, row and byte counts per query shape (see query_shape).
+
+    Each shape keeps a latency histogram over all its calls and its most
+    recent `keep` timings, from which percentiles() computes p50/p95/p99.
+    Calls slower than slow_ms are also written to a rotating slow-query log
+    at slow_log (None to disable).
+
+    DMS_SLOW_QUERY_MS and DMS_SLOW_QUERY_LOG override the defaults.
+    """
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    MAX_SHAPES = 500
+
+    def __init__(self, slow_ms=500, slow_log="slow_queries.log",
+                 max_bytes=5 * 1024 * 1024, backups=3, keep=1000):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.keep = keep
+        self._shapes = {}
+        self._shape_of = {}  # raw statement -> shape, to skip the regexes
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def _shape(self, query):
+        shape = self._shape_of.get(query)
+        if shape is None:
+            shape = query_shape(query)
+            if len(self._shape_of) >= 4 * self.MAX_SHAPES:
+                self._shape_of.clear()
+            self._shape_of[query] = shape
+        return shape
+
+    def _entry(self, shape):
+        # Called with the lock held
+        entry = self._shapes.get(shape)
+        if entry is None:
+            if len(self._shapes) >= self.MAX_SHAPES:
+                shape = "(other)"
+                entry = self._shapes.get(shape)
+            if entry is None:
+                entry = self._shapes[shape] = _ShapeStats(self.BUCKETS_MS, self.keep)
+        return entry
+
+    def record(self, query, ms, rows=0, nbytes=0, error=False):
+        """Adds one execution of query that took ms milliseconds."""
+        shape = self._shape(query)
+        with self._lock:
+            entry = self._entry(shape)
+            entry.calls += 1
+            entry.errors += bool(error)
+            entry.rows += rows
+            entry.bytes += nbytes
+            entry.total_ms += ms
+            entry.max_ms = max(entry.max_ms, ms)
+            entry.histogram[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+            entry.recent.append(ms)
+        if self.slow_ms is not None and ms >= self.slow_ms:
+            self._log_slow(query, ms, rows, nbytes, error)
+
+    def cache_hit(self, query):
+        shape = self._shape(query)
+        with self._lock:
+            self._entry(shape).cache_hits += 1
+
+    def _log_slow(self, query, ms, rows, nbytes, error):
+        logger = self._slow_logger()
+        if logger is None:
+            return
+        # Statement text only: params may hold credentials
+        logger.info("%.1f ms rows=%d bytes=%d thread=%s%s | %s", ms, rows, nbytes,
+                    threading.current_thread().name, " error" if error else "",
+                    _statement(query, 1000))
+
+    def _slow_logger(self):
+        """The slow-query logger, set up once on first use; None if disabled."""
+        with self._lock:
+            if self._logger is None and self.slow_log:
+                try:
+                    handler = logging.handlers.RotatingFileHandler(
+                        self.slow_log, maxBytes=self.max_bytes, backupCount=self.backups,
+                        encoding="utf-8")
+                except (IOError, OSError) as e:
+                    print("Error opening slow query log: {}".format(e))
+                    self.slow_log = None
+                    return None
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                # Not registered with logging: each QueryStats owns its handler
+                logger = logging.Logger("db_handler.slow_queries", logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                self._logger = logger
+            return self._logger
+
+    @staticmethod
+    def _percentile(ordered, p):
+        # Nearest rank
+        if not ordered:
+            return None
+        rank = max(1, int(-(-p * len(ordered) // 100)))
+        return round(ordered[rank - 1], 3)
+
+    def percentiles(self, shape=None, points=(50, 95, 99)):
+        """
+        {shape: {"p50": ms, "p95": ms, "p99": ms}} over the recent timings of
+        every shape, or of the one given (as returned by query_shape).
+        """
+        with self._lock:
+            shapes = [shape] if shape is not None else list(self._shapes)
+            recent = dict((s, sorted(self._shapes[s].recent)) for s in shapes if s in self._shapes)
+        return dict((s, dict(("p%d" % p, self._percentile(timings, p)) for p in points))
+                    for s, timings in recent.items())
+
+    def snapshot(self):
+        """Every shape's counters, histogram (ms upper bound -> calls) and percentiles."""
+        percentiles = self.percentiles()
+        bounds = [str(b) for b in self.BUCKETS_MS] + ["inf"]
+        result = {}
+        with self._lock:
+            for shape, entry in self._shapes.items():
+                executed = entry.calls
+                stats = {"calls": executed, "errors": entry.errors,
+                         "cache_hits": entry.cache_hits, "rows": entry.rows,
+                         "bytes": entry.bytes, "total_ms": round(entry.total_ms, 3),
+                         "mean_ms": round(entry.total_ms / executed, 3) if executed else None,
+                         "max_ms": round(entry.max_ms, 3),
+                         "histogram": dict(zip(bounds, entry.histogram))}
+                stats.update(percentiles.get(shape, {}))
+                result[shape] = stats
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+
+def _batch_report(batch, rows, seconds):
+    """What on_batch callbacks receive for each batch written."""
+    return {"batch": batch, "rows": rows, "ms": round(seconds * 1000, 3),
+            "rows_per_s": round(rows / seconds, 1) if seconds > 0 else None}
+
+class BatchWriter(object):
+    """
+    Buffers rows for one table and writes them as multi-row INSERTs,
+    batch_size rows per statement, all in a single transaction:
+
+        with db.batch_writer("drawing_users", ["admin_name", "department"]) as writer:
+            for user in imported:
+                writer.add(user)
+
+    Rows are dicts (read by column name) or sequences in column order.
+    With update (a list of columns), existing rows are updated instead via
+    ON DUPLICATE KEY UPDATE, which makes this a batched multi-row UPDATE
+    keyed on the table's primary or unique key.
+
+    Leaving the with block commits; an exception rolls everything back and
+    propagates. Each batch is reported to on_batch (see _batch_report) and
+    kept in self.batches.
+    """
+    def __init__(self, db, table, columns, batch_size=500, update=None, on_batch=None):
+        self.db = db
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.batches = []
+        self.rows = 0
+        self._pending = []
+        self._conn = None
+        self._prefix = "INSERT INTO %s (%s) VALUES " % (table, ", ".join(self.columns))
+        self._row_sql = "(%s)" % ", ".join(["%s"] * len(self.columns))
+        self._suffix = ""
+        if update:
+            self._suffix = " ON DUPLICATE KEY UPDATE " + ", ".join(
+                "%s=VALUES(%s)" % (c, c) for c in update)
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is None:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback(exc)
+        return False
+
+    def begin(self):
+        """Leases a connection and opens the transaction; raises if none can be had."""
+        self._conn = self.db.pool.acquire()
+        self._conn.begin()
+
+    def add(self, row):
+        if isinstance(row, dict):
+            row = [row.get(c) for c in self.columns]
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Sends the buffered rows as one statement (still uncommitted)."""
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        sql = self._prefix + ", ".join([self._row_sql] * len(rows)) + self._suffix
+        params = [value for row in rows for value in row]
+        start = time.perf_counter()
+        failed = True
+        try:
+            with tracing.tracer.span("db.batch", table=self.table, rows=len(rows)):
+                with self._conn.cursor() as cursor:
+                    cursor.execute(sql, params)
+            failed = False
+        finally:
+            seconds = time.perf_counter() - start
+            self.db.metrics.record(sql, seconds * 1000, len(rows), _payload_bytes(rows), failed)
+        self._report(len(rows), seconds)
+
+    def _report(self, rows, seconds):
+        self.rows += rows
+        report = _batch_report(len(self.batches) + 1, rows, seconds)
+        self.batches.append(report)
+        if self.on_batch:
+            self.on_batch(report)
+
+    def commit(self):
+        try:
+            self.flush()
+            self._conn.commit()
+        except Exception as e:
+            self.rollback(e)
+            raise
+        self._finish(None)
+
+    def rollback(self, error=None):
+        self._pending = []
+        try:
+            self._conn.rollback()
+            rolled_back = True
+        except Exception:
+            rolled_back = False
+        # A connection that may still hold the transaction is dropped
+        self._finish(error, broken=not rolled_back)
+
+    def _finish(self, error, broken=False):
+        conn, self._conn = self._conn, None
+        self.db.pool.release(conn, broken or self.db._is_broken(error))
+        self.db.invalidate(self.table)
 
 class DBHandler:
     def __init__(self):
@@ -12,83 +665,305 @@ class DBHandler:
         self.user = "erp"
         self.password = "erpdeveloper"
         self.dbname = "mdiacc"
-        self.conn = None
+        # Every thread (login, warm-up, each table load) leases its own
+        # connection, so page loads run in parallel instead of sharing one.
+        self.pool = ConnectionPool(self._connect)
+        # Repeated SELECTs (page switches, counts) are answered from memory
+        # until they expire or a write through execute_query touches a
+        # table they read.
+        self.cache = QueryCache()
+        # Timings per query shape, and the slow-query log
+        self.metrics = QueryStats(
+            slow_ms=_env_float("DMS_SLOW_QUERY_MS", 500),
+            slow_log=os.environ.get("DMS_SLOW_QUERY_LOG", "slow_queries.log") or None)
+
+    def _connect(self):
+        # autocommit, so a pooled connection never sits in a stale read
+        # snapshot; writes open their own transaction
+        return pymysql.connect(
+            host=self.host,
+            user=self.user,
+            passwd=self.password,
+            db=self.dbname,
+            charset='utf8',
+            cursorclass=pymysql.cursors.DictCursor,
+            autocommit=True
+        )
 
     def warm_up(self):
-        """Pre-establishes the database connection in a background thread."""
+        """Pre-establishes a pooled database connection in a background thread."""
         def connect():
-            try:
-                self.get_connection()
+            conn = self.get_connection()
+            if conn:
+                self.release_connection(conn)
                 print("Database connection warmed up successfully.")
-            except Exception as e:
-                print("Failed to warm up database connection: {}".format(e))
-        
+            else:
+                print("Failed to warm up database connection.")
+
         thread = threading.Thread(target=connect)
         thread.daemon = True
         thread.start()
 
     def get_connection(self):
-        """Returns a database connection."""
+        """
+        Leases a connection from the pool, or returns None if none could be
+        had. Hand it back with release_connection().
+        """
         try:
-            if self.conn is None or not self.conn.open:
-                self.conn = pymysql.connect(
-                    host=self.host,
-                    user=self.user,
-                    passwd=self.password,
-                    db=self.dbname,
-                    charset='utf8',
-                    cursorclass=pymysql.cursors.DictCursor
-                )
-            return self.conn
+            return self.pool.acquire()
         except pymysql.Error as e:
             print("Error connecting to MySQL Database: {}".format(e))
-            return None
+        except PoolTimeout as e:
+            print("Error getting a database connection: {}".format(e))
+        return None
 
-    def fetch_all(self, query, params=None):
-        """Executes a query and returns all results."""
-        conn = self.get_connection()
-        if not conn:
-            return []
-        
+    def release_connection(self, conn, error=None):
+        """Returns a leased connection; it is dropped if error says it is unusable."""
+        self.pool.release(conn, self._is_broken(error))
+
+    @staticmethod
+    def _is_broken(error):
+        return isinstance(error, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+
+    def _lease(self):
+        """Like get_connection(), but raises the error if none can be had."""
+        try:
+            return self.pool.acquire()
+        except (pymysql.Error, PoolTimeout) as e:
+            print("Error connecting to MySQL Database: {}".format(e))
+            raise
+
+    def fetch_all(self, query, params=None, cache=True, ttl=None, strict=False):
+        """
+        Executes a query and returns all results. Results are cached unless
+        cache is False (ttl overrides the cache's default lifetime); pass
+        cache=False for reads that must see the database as it is now.
+        Errors are printed and give [], or with strict are raised, for
+        callers that must tell a failed read from an empty one.
+        """
+        key = self.cache.key(query, params) if cache else None
+        cache = key is not None
+        if cache:
+            rows = self.cache.get(key)
+            if rows is not None:
+                tracing.tracer.current().mark("db.cache_hit", sql=_statement(query), rows=len(rows))
+                self.metrics.cache_hit(query)
+                return rows
+            epoch = self.cache.epoch()
+
+        if strict:
+            conn = self._lease()
+        else:
+            conn = self.get_connection()
+            if not conn:
+                return []
+
+        error = None
+        rows = []
         cursor = conn.cursor()
+        start = time.perf_counter()
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            return cursor.fetchall()
+            with tracing.tracer.span("db.fetch_all", sql=_statement(query)) as span:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                rows = cursor.fetchall()
+                if tracing.tracer.current():
+                    span.attrs["rows"] = len(rows)
+            if cache:
+                self.cache.put(key, rows, read_tables(query), epoch, ttl)
+            return rows
         except pymysql.Error as e:
             print("Error executing query: {}".format(e))
+            error = e
+            if strict:
+                raise
             return []
         finally:
+            self.metrics.record(query, (time.perf_counter() - start) * 1000,
+                                len(rows), _payload_bytes(rows), error is not None)
             cursor.close()
+            self.release_connection(conn, error)
+
+    def fetch_iter(self, query, params=None, batch_size=1000):
+        """
+        Executes a query on an unbuffered server-side cursor and yields the
+        results as lists of up to batch_size rows, so a large result set is
+        never held in memory at once and the first batch is available before
+        the server has sent the rest. Results bypass the query cache.
+
+        The connection stays leased until the generator is exhausted or
+        closed. Closing it early (or an error) drops the connection rather
+        than reading the remaining rows off the wire.
+
+        Unlike fetch_all, errors are raised to the consumer, also when no
+        connection can be had: a stream that was cut short must not be
+        mistaken for the end of the results.
+        """
+        conn = self._lease()
+
+        finished = False
+        error = None
+        total = nbytes = 0
+        elapsed = 0.0  # time spent in the database, not in the consumer
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            start = time.perf_counter()
+            with tracing.tracer.span("db.fetch_iter", sql=_statement(query)):
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - start
+                if not rows:
+                    break
+                total += len(rows)
+                nbytes += _payload_bytes(rows)
+                yield rows
+                start = time.perf_counter()
+            finished = True
+            tracing.tracer.current().mark("db.fetch_iter_done", rows=total)
+        except pymysql.Error as e:
+            print("Error executing query: {}".format(e))
+            error = e
+            elapsed += time.perf_counter() - start
+            raise
+        finally:
+            self.metrics.record(query, elapsed * 1000, total, nbytes, error is not None)
+            if finished:
+                cursor.close()
+            self.pool.release(conn, broken=not finished or self._is_broken(error))
 
     def execute_query(self, query, params=None):
         """Executes a query (INSERT, UPDATE, DELETE)."""
         conn = self.get_connection()
         if not conn:
             return False
-        
+
+        error = None
+        affected = 0
         cursor = conn.cursor()
+        start = time.perf_counter()
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            conn.commit()
+            with tracing.tracer.span("db.execute", sql=_statement(query)):
+                conn.begin()
+                if params:
+                    affected = cursor.execute(query, params)
+                else:
+                    affected = cursor.execute(query)
+                conn.commit()
             return True
         except pymysql.Error as e:
             print("Error executing query: {}".format(e))
-            conn.rollback()
+            error = e
+            try:
+                conn.rollback()
+            except pymysql.Error:
+                pass
             return False
         finally:
+            self.metrics.record(query, (time.perf_counter() - start) * 1000, affected or 0,
+                                _payload_bytes([params]) if params else 0, error is not None)
             cursor.close()
+            self.release_connection(conn, error)
+            # Also on failure: a lost connection may still have committed
+            self.invalidate_for(query)
+
+    def invalidate_for(self, query):
+        """Evicts cached results a write statement may have changed."""
+        table = write_table(query)
+        if table:
+            self.cache.invalidate(table)
+        else:
+            self.cache.invalidate()
+
+    def invalidate(self, *tables):
+        """Evicts cached results reading tables (all of them if none are given)."""
+        self.cache.invalidate(*tables)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def execute_many(self, query, seq_params, batch_size=500, on_batch=None):
+        """
+        Executes one statement for every params in seq_params, batch_size at
+        a time, in a single transaction: all rows are written or none are.
+        pymysql sends an INSERT/REPLACE ... VALUES batch as one multi-row
+        statement; other statements run row by row but share the commit.
+        on_batch receives a throughput report (see _batch_report) per batch.
+        Exceptions other than database errors (bad params, on_batch) roll
+        back and propagate.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return False
+
+        committed = False
+        cursor = conn.cursor()
+        seq_params = iter(seq_params)
+        try:
+            with tracing.tracer.span("db.execute_many", sql=_statement(query)) as span:
+                conn.begin()
+                batch, total = 0, 0
+                while True:
+                    chunk = list(islice(seq_params, batch_size))
+                    if not chunk:
+                        break
+                    start = time.perf_counter()
+                    failed = True
+                    try:
+                        cursor.executemany(query, chunk)
+                        failed = False
+                    finally:
+                        seconds = time.perf_counter() - start
+                        self.metrics.record(query, seconds * 1000, len(chunk),
+                                            _payload_bytes(chunk), failed)
+                    batch += 1
+                    total += len(chunk)
+                    if on_batch:
+                        on_batch(_batch_report(batch, len(chunk), seconds))
+                conn.commit()
+                committed = True
+                if tracing.tracer.current():
+                    span.attrs.update(rows=total, batches=batch)
+            return True
+        except pymysql.Error as e:
+            print("Error executing query: {}".format(e))
+            return False
+        finally:
+            if not committed:
+                # Whatever went wrong, earlier batches must not stay pending:
+                # the next begin() on this connection would commit them
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            cursor.close()
+            # Not knowing how it failed, don't hand the connection out again
+            self.pool.release(conn, broken=not committed)
+            self.invalidate_for(query)
+
+    def batch_writer(self, table, columns, batch_size=500, update=None, on_batch=None):
+        """A BatchWriter for multi-row INSERTs (or upserts) into table; use it in a with block."""
+        return BatchWriter(self, table, columns, batch_size, update, on_batch)
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def query_stats(self):
+        """Calls, errors, rows, bytes, latency histogram and percentiles per query shape."""
+        return self.metrics.snapshot()
+
+    def query_percentiles(self, query=None):
+        """p50/p95/p99 in ms per query shape, or just for the shape of query."""
+        return self.metrics.percentiles(query_shape(query) if query else None)
 
     def close(self):
-        """Closes the connection."""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Closes the pooled connections."""
+        self.pool.close_all()
 
 # Global instance for easy access
 db = DBHandler()
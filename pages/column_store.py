@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+from itertools import compress
+
+# Marks a key absent from a row (distinct from a stored None)
+MISSING = object()
+
+class _ObjectColumn(object):
+    kind = "object"
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, i):
+        return self.values[i]
+
+    def set(self, i, value):
+        self.values[i] = value
+        return self
+
+    def append(self, value):
+        self.values.append(value)
+        return self
+
+    def extend(self, values):
+        self.values.extend(values)
+        return self
+
+    def delete(self, i):
+        del self.values[i]
+
+    def keep(self, mask):
+        self.values = list(compress(self.values, mask))
+
+    def tolist(self):
+        return list(self.values)
+
+class _IntColumn(object):
+    """Plain ints stored unboxed in a signed 64-bit array."""
+    kind = "int"
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, i):
+        return self.values[i]
+
+    def _widen(self):
+        return _ObjectColumn(self.values.tolist())
+
+    def set(self, i, value):
+        if type(value) is not int:
+            return self._widen().set(i, value)
+        try:
+            self.values[i] = value
+        except OverflowError:
+            return self._widen().set(i, value)
+        return self
+
+    def append(self, value):
+        if type(value) is not int:
+            return self._widen().append(value)
+        try:
+            self.values.append(value)
+        except OverflowError:
+            return self._widen().append(value)
+        return self
+
+    def extend(self, values):
+        if all(type(v) is int for v in values):
+            try:
+                self.values.extend(array("q", values))
+                return self
+            except OverflowError:
+                pass
+        return self._widen().extend(values)
+
+    def delete(self, i):
+        del self.values[i]
+
+    def keep(self, mask):
+        self.values = array("q", compress(self.values, mask))
+
+    def tolist(self):
+        return self.values.tolist()
+
+def _internable(value):
+    # Only values whose equality means identical content: True == 1 == 1.0
+    # and Decimal("1.5") == Decimal("1.50") would be merged into one code
+    return value is None or value is MISSING or type(value) is str
+
+class _CategoryColumn(object):
+    """Low-cardinality strings (status, department...) interned as 16-bit codes."""
+    kind = "category"
+    MAX_CATEGORIES = 65535
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+        self.lookup = dict((v, c) for c, v in enumerate(categories))
+
+    def get(self, i):
+        return self.categories[self.codes[i]]
+
+    def _code(self, value):
+        if not _internable(value):
+            return None
+        code = self.lookup.get(value)
+        if code is None and len(self.categories) < self.MAX_CATEGORIES:
+            code = len(self.categories)
+            self.categories.append(value)
+            self.lookup[value] = code
+        return code
+
+    def _widen(self):
+        return _ObjectColumn([self.categories[c] for c in self.codes])
+
+    def set(self, i, value):
+        code = self._code(value)
+        if code is None:
+            return self._widen().set(i, value)
+        self.codes[i] = code
+        return self
+
+    def append(self, value):
+        code = self._code(value)
+        if code is None:
+            return self._widen().append(value)
+        self.codes.append(code)
+        return self
+
+    def extend(self, values):
+        codes = []
+        for value in values:
+            code = self._code(value)
+            if code is None:
+                return self._widen().extend(values)
+            codes.append(code)
+        self.codes.extend(array("H", codes))
+        return self
+
+    def delete(self, i):
+        del self.codes[i]
+
+    def keep(self, mask):
+        self.codes = array("H", compress(self.codes, mask))
+
+    def tolist(self):
+        categories = self.categories
+        return [categories[c] for c in self.codes]
+
+def _make_column(values):
+    if values and all(type(v) is int for v in values):
+        try:
+            return _IntColumn(array("q", values))
+        except OverflowError:
+            pass
+    if not all(_internable(v) for v in values):  # e.g. lists of access tokens
+        return _ObjectColumn(values)
+    distinct = set(values)
+    if len(distinct) <= _CategoryColumn.MAX_CATEGORIES and len(distinct) * 4 <= len(values):
+        categories = list(distinct)
+        lookup = dict((v, c) for c, v in enumerate(categories))
+        return _CategoryColumn(array("H", [lookup[v] for v in values]), categories)
+    return _ObjectColumn(values)
+
+class RowView(object):
+    """
+    Dict-like view of one row of a ColumnStore. Reads and writes go straight
+    to the columns, so formatters, action buttons and page callbacks can keep
+    treating rows as records.
+    """
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def get(self, key, default=None):
+        return self.store.get(self.index, key, default)
+
+    def __getitem__(self, key):
+        value = self.store.get(self.index, key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store.set(self.index, key, value)
+
+    def __contains__(self, key):
+        return self.store.get(self.index, key, MISSING) is not MISSING
+
+    def keys(self):
+        return [k for k in self.store.keys if k in self]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return (isinstance(other, RowView) and other.store is self.store
+                and other.index == self.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    def __repr__(self):
+        return "RowView(%r)" % self.to_dict()
+
+class ColumnStore(object):
+    """
+    Column-oriented table data: one array per key instead of one dict per
+    row. Integer columns are unboxed, repetitive columns are stored as codes
+    into a category list, and rows are addressed by position, so views
+    (filter results, sort orders) are plain integer arrays.
+
+    Every row carries a version stamp, unique within the store, that is
+    renewed whenever the row is written or touched. Caches keyed by row
+    position check it to detect edits, and since stamps are never reused,
+    also rows that moved into the position after a delete().
+    """
+    def __init__(self, keys=None):
+        self.keys = list(keys or [])
+        self.columns = dict((k, _ObjectColumn([])) for k in self.keys)
+        self.versions = array("L")
+        self._clock = 0
+
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        keys, seen = [], set()
+        for d in records:
+            for k in d.keys():
+                if k not in seen:
+                    seen.add(k)
+                    keys.append(k)
+        store = cls()
+        store.keys = keys
+        for k in keys:
+            store.columns[k] = _make_column([d.get(k, MISSING) for d in records])
+        store.versions = array("L", range(len(records)))
+        store._clock = len(records)
+        return store
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __getitem__(self, i):
+        return RowView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield RowView(self, i)
+
+    def row(self, i):
+        return RowView(self, i)
+
+    def column(self, key):
+        return self.columns.get(key)
+
+    def column_values(self, key):
+        """All values of a column as a list (MISSING where a row lacks the key)."""
+        col = self.columns.get(key)
+        if col is None:
+            return [MISSING] * len(self)
+        return col.tolist()
+
+    def get(self, i, key, default=None):
+        col = self.columns.get(key)
+        if col is None:
+            return default
+        value = col.get(i)
+        return default if value is MISSING else value
+
+    def set(self, i, key, value):
+        col = self.columns.get(key)
+        if col is None:
+            col = _ObjectColumn([MISSING] * len(self))
+            self.keys.append(key)
+        self.columns[key] = col.set(i, value)
+        self.touch(i)
+
+    def _stamp(self):
+        self._clock += 1
+        return self._clock
+
+    def touch(self, i):
+        self.versions[i] = self._stamp()
+
+    def append(self, record):
+        """Adds a row from a dict (or RowView) and returns its position."""
+        i = len(self)
+        for k in record.keys():
+            if k not in self.columns:
+                self.keys.append(k)
+                self.columns[k] = _ObjectColumn([MISSING] * i)
+        for k in self.keys:
+            self.columns[k] = self.columns[k].append(record.get(k, MISSING))
+        self.versions.append(self._stamp())
+        return i
+
+    def extend(self, records):
+        """Adds rows from a list of dicts, column by column."""
+        n = len(self)
+        for d in records:
+            for k in d.keys():
+                if k not in self.columns:
+                    self.keys.append(k)
+                    self.columns[k] = _ObjectColumn([MISSING] * n)
+        for k in self.keys:
+            self.columns[k] = self.columns[k].extend([d.get(k, MISSING) for d in records])
+        start = self._clock + 1
+        self._clock += len(records)
+        self.versions.extend(array("L", range(start, self._clock + 1)))
+
+    def delete(self, i):
+        """Removes row i; rows after it move up one position."""
+        for col in self.columns.values():
+            col.delete(i)
+        del self.versions[i]
+
+    def keep(self, mask):
+        """
+        Drops every row whose entry in mask (a bytearray, one per row) is 0
+        in a single pass; the rest keep their order and versions.
+        """
+        for col in self.columns.values():
+            col.keep(mask)
+        self.versions = array("L", compress(self.versions, mask))
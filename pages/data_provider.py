@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+class PagedDataProvider(object):
+    """
+    Protocol for tables that page, search and sort on the server instead of
+    loading the whole dataset. CanvasDataTable calls these from worker threads.
+
+    Pages are addressed by keyset: fetch_page() receives the key of the last
+    row of the previous page (None for the first page), as returned by
+    key_of(), and returns at most `limit` rows after it.
+
+    count() and fetch_page() raise when the data can't be read; an empty
+    result always means there are no rows.
+    """
+    def count(self, query):
+        """Total number of rows matching query ("" for no search)."""
+        raise NotImplementedError
+
+    def fetch_page(self, query, after_key, limit, sort=None):
+        """
+        Rows matching query that follow after_key, in order.
+        sort is None for key order, or (data_key, descending).
+        """
+        raise NotImplementedError
+
+    def key_of(self, record, sort=None):
+        """Keyset position of record under the given sort."""
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Drops anything cached, e.g. on an explicit refresh."""
+        pass
+
+class SQLPagedProvider(PagedDataProvider):
+    """
+    Keyset-paginated provider over a single table.
+
+    columns maps the data keys the table uses to SQL expressions, e.g.
+    {"no": "drawing_no"}. key must be one of them and unique; it breaks
+    ties when sorting on another column. where/where_params restrict the
+    rows, search_keys are matched with LIKE, and row_hook (if given) is
+    applied to every fetched row. search_extra, if given, is called with the
+    search query and returns the keys of further rows that match it on
+    fields kept outside the table (such as ones row_hook fills in). Results go through the DBHandler's
+    query cache, counts for at most count_ttl seconds; a write to the table
+    through the same handler evicts both. Database errors are raised.
+    """
+    def __init__(self, db, table, columns, key,
+                 where=None, where_params=(),
+                 search_keys=None, row_hook=None, search_extra=None, count_ttl=30):
+        self.db = db
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.where = where
+        self.where_params = tuple(where_params)
+        self.search_keys = search_keys or list(columns)
+        self.row_hook = row_hook
+        self.search_extra = search_extra
+        self.count_ttl = count_ttl
+
+    def _select_list(self):
+        return ", ".join("%s AS %s" % (expr, alias) for alias, expr in self.columns.items())
+
+    def _filters(self, query):
+        clauses, params = [], []
+        if self.where:
+            clauses.append("(%s)" % self.where)
+            params.extend(self.where_params)
+        if query:
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            likes = ["%s LIKE %%s" % self.columns[k] for k in self.search_keys]
+            params.extend([pattern] * len(likes))
+            extra = list(self.search_extra(query)) if self.search_extra else []
+            if extra:
+                likes.append("%s IN (%s)" % (self.columns[self.key], ", ".join(["%s"] * len(extra))))
+                params.extend(extra)
+            clauses.append("(%s)" % " OR ".join(likes))
+        return clauses, params
+
+    def count(self, query):
+        clauses, params = self._filters(query)
+        sql = "SELECT COUNT(*) AS n FROM %s" % self.table
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        rows = self.db.fetch_all(sql, tuple(params), ttl=self.count_ttl, strict=True)
+        return int(rows[0]["n"])
+
+    def fetch_page(self, query, after_key, limit, sort=None):
+        clauses, params = self._filters(query)
+        key_expr = self.columns[self.key]
+        if sort and sort[0] != self.key:
+            sort_expr = self.columns[sort[0]]
+            direction = "DESC" if sort[1] else "ASC"
+            if after_key is not None:
+                clause, clause_params = self._after(sort_expr, key_expr, after_key, sort[1])
+                clauses.append(clause)
+                params.extend(clause_params)
+            order = "%s %s, %s %s" % (sort_expr, direction, key_expr, direction)
+        else:
+            descending = bool(sort and sort[1])
+            if after_key is not None:
+                clauses.append("%s %s %%s" % (key_expr, "<" if descending else ">"))
+                params.append(after_key[0])
+            order = "%s %s" % (key_expr, "DESC" if descending else "ASC")
+
+        sql = "SELECT %s FROM %s" % (self._select_list(), self.table)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY %s LIMIT %%s" % order
+        params.append(int(limit))
+
+        rows = self.db.fetch_all(sql, tuple(params), strict=True)
+        if self.row_hook:
+            for row in rows:
+                self.row_hook(row)
+        return rows
+
+    @staticmethod
+    def _after(sort_expr, key_expr, after_key, descending):
+        """
+        Keyset predicate for the rows after (value, key) in ORDER BY
+        sort_expr, key_expr. MySQL sorts NULLs first ascending and last
+        descending, and a row comparison against NULL is never true, so
+        NULL sort values get explicit branches.
+        """
+        value, key = after_key
+        if value is None:
+            if descending:
+                # Only NULLs are left, in key order
+                return "(%s IS NULL AND %s < %%s)" % (sort_expr, key_expr), [key]
+            return ("((%s IS NULL AND %s > %%s) OR %s IS NOT NULL)"
+                    % (sort_expr, key_expr, sort_expr)), [key]
+        clause = "(%s, %s) %s (%%s, %%s)" % (sort_expr, key_expr, "<" if descending else ">")
+        if descending:
+            clause = "(%s OR %s IS NULL)" % (clause, sort_expr)
+        return clause, [value, key]
+
+    def key_of(self, record, sort=None):
+        if sort and sort[0] != self.key:
+            return (record.get(sort[0]), record.get(self.key))
+        return (record.get(self.key),)
+
+    def invalidate(self):
+        self.db.invalidate(self.table)
@@ -17,6 +17,8 @@ class DrawingIssuancePage(ttk.Frame):
             headers=["Drawing ID", "Revision", "Status", "Requested By", "Actions"],
             initial_widths=[180, 90, 130, 280, 200],
             fetch_data_func=self._generate_static_data,
+            key_field="no",
+            fresh_ttl=30,
             get_action_buttons_func=self._get_actions,
             search_placeholder="Search requests...",
             search_keys=["no", "rev", "status", "requested_by"],
@@ -43,7 +45,8 @@ class DrawingIssuancePage(ttk.Frame):
             {"no": "ENG-2024-002", "rev": "0",   "status": "REQUESTED", "requested_by": "Sarah Wilson"},
             {"no": "ST-9982-X",    "rev": "B",   "status": "REQUESTED", "requested_by": "Michael Scott"},
         ]
-        return base * 8
+        # Drawing numbers are the key, so each copy gets its own suffix
+        return [dict(d, no="%s-%02d" % (d["no"], n)) for n in range(1, 9) for d in base]
 
     def _get_actions(self, record):
         buttons = []
@@ -54,15 +57,13 @@ class DrawingIssuancePage(ttk.Frame):
     def _handle_issue(self, record):
         drawing_no = record.get("no")
         messagebox.showinfo("Issuance", "Drawing %s has been issued successfully." % drawing_no)
-        self.table.data = [d for d in self.table.data if d["no"] != drawing_no]
-        self.table._apply_search()
+        self.table.remove(drawing_no)
 
     def _handle_reject(self, record):
         drawing_no = record.get("no")
         if messagebox.askyesno("Reject", "Are you sure you want to reject the request for %s?" % drawing_no):
             messagebox.showwarning("Rejected", "Request for %s rejected." % drawing_no)
-            self.table.data = [d for d in self.table.data if d["no"] != drawing_no]
-            self.table._apply_search()
+            self.table.remove(drawing_no)
 
-    def refresh(self):
-        self.table.refresh()
\ No newline at end of file
+    def refresh(self, force=False):
+        self.table.refresh(force)
\ No newline at end of file
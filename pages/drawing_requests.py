@@ -6,20 +6,43 @@ from tkinter import messagebox
 import datetime
 import threading
 from pages.table_component import CanvasDataTable
+from pages.data_provider import SQLPagedProvider
 import styles
 
 class DrawingRequestsPage(ttk.Frame):
     def __init__(self, parent, username="User"):
         ttk.Frame.__init__(self, parent)
         self.username = username
-        
+        # Drawing no -> "user at time" for the requests made on this page.
+        # Rows are refetched on every search, sort and refresh, so this is
+        # what the fetched rows are filled in from.
+        self._requested = {}
+        # search_extra reads it from the provider's worker thread
+        self._requested_lock = threading.Lock()
+
+        # The register is far too large to load at once, so the table pages
+        # through it in SQL instead of taking a fetch_data_func.
+        from db_handler import db
+        self.provider = SQLPagedProvider(
+            db, "drawings_master_bal",
+            columns={"no": "drawing_no",
+                     "rev": "latest_revision",
+                     "status": "current_status"},
+            key="no",
+            where="current_status = %s", where_params=("Approved",),
+            row_hook=self._init_row,
+            search_extra=self._requested_matching
+        )
+
         # Initialize the reusable table component
         self.table = CanvasDataTable(
             self,
             title="Drawing Requisitions",
             headers=["Drawing ID", "Revision", "Status", "Requested By", "Action"],
             initial_widths=[200, 100, 140, 300, 140],
-            fetch_data_func=self._fetch_drawings,
+            data_provider=self.provider,
+            key_field="no",
+            fresh_ttl=30,
             get_action_buttons_func=self._get_actions,
             search_placeholder="Search drawings...",
             search_keys=["no", "rev", "status", "requested_by"],
@@ -39,27 +62,14 @@ class DrawingRequestsPage(ttk.Frame):
         fg = "#4f46e5" if val else "#1f2937"
         return val, fg, ("Segoe UI", 9, "italic"), "w"
 
-    def _fetch_drawings(self):
-        try:
-            import sys, os
-            sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-            from db_handler import db
+    def _init_row(self, row):
+        row['requested_by'] = self._requested.get(row['no'], "")
 
-            query = """
-                SELECT drawing_no as no,
-                       latest_revision as rev,
-                       current_status as status
-                FROM drawings_master_bal
-                WHERE current_status = 'Approved'
-                LIMIT 200
-            """
-            rows = db.fetch_all(query) or []
-            for row in rows:
-                row['requested_by'] = ""
-            return rows
-        except Exception as e:
-            print("Error fetching drawings: {}".format(e))
-            return []
+    def _requested_matching(self, query):
+        query = query.lower()
+        with self._requested_lock:
+            requested = list(self._requested.items())
+        return [no for no, text in requested if query in text.lower()]
 
     def _get_actions(self, drawing):
         buttons = []
@@ -79,13 +89,11 @@ class DrawingRequestsPage(ttk.Frame):
         requested_text = "%s at %s" % (self.username, now)
         
         # Update local data
-        for d in self.table.data:
-            if d.get("no") == drawing_no:
-                d["requested_by"] = requested_text
-                break
-        
-        self.table._apply_search()
+        with self._requested_lock:
+            self._requested[drawing_no] = requested_text
+        self.table.upsert(drawing_no, {"requested_by": requested_text})
+
         messagebox.showinfo("Success", "Request submitted for %s" % drawing_no)
 
-    def refresh(self):
-        self.table.refresh()
\ No newline at end of file
+    def refresh(self, force=False):
+        self.table.refresh(force)
\ No newline at end of file
@@ -5,7 +5,15 @@ import tkinter as tk
 from tkinter import ttk
 import threading
 import datetime
+import time
+import bisect
+import numbers
 import tkinter.font as tkfont
+from array import array
+from collections import OrderedDict
+from itertools import compress
+from pages.column_store import ColumnStore, MISSING
+import tracing
 
 try:
     import styles
@@ -17,6 +25,424 @@ except ImportError:
         SECONDARY = "#64748b"
     styles = DummyStyles()
 
+class LRUCache(object):
+    """A small bounded mapping that evicts the least recently used entry."""
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def put(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class TextTruncator(object):
+    """
+    Ellipsizes text to a pixel width using real font metrics.
+    The cut point is found by binary search over prefixes, and both text
+    widths and results are memoized per (font, text[, width]) so repainting
+    the same cells costs dictionary lookups rather than Tk measure calls.
+    """
+    ELLIPSIS = "..."
+
+    def __init__(self, widget, max_entries=4096):
+        self.widget = widget
+        self._fonts = {}
+        self._widths = LRUCache(max_entries)
+        self._results = LRUCache(max_entries)
+
+    def _font(self, font):
+        f = self._fonts.get(font)
+        if f is None:
+            f = tkfont.Font(root=self.widget, font=font)
+            self._fonts[font] = f
+        return f
+
+    def measure(self, font, text):
+        key = (font, text)
+        width = self._widths.get(key)
+        if width is None:
+            width = self._font(font).measure(text)
+            self._widths.put(key, width)
+        return width
+
+    def truncate(self, text, font, max_width):
+        key = (font, text, max_width)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+
+        if self.measure(font, text) <= max_width:
+            result = text
+        else:
+            f = self._font(font)
+            avail = max_width - self.measure(font, self.ELLIPSIS)
+            # Longest prefix that still fits next to the ellipsis
+            lo, hi = 0, len(text)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if f.measure(text[:mid]) <= avail:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            if lo == 0:
+                result = self.ELLIPSIS if avail >= 0 else ""
+            else:
+                result = text[:lo].rstrip() + self.ELLIPSIS
+        self._results.put(key, result)
+        return result
+
+class SearchIndex(object):
+    """
+    Normalized search text per row of a ColumnStore: the lower-cased search
+    fields joined by a separator no query can contain, so a substring test
+    against it matches exactly when one of the fields matches.
+    """
+    SEP = "\x00"
+
+    def __init__(self, keys=None):
+        self.keys = keys or []
+        self._haystacks = []  # row position -> haystack
+
+    def __len__(self):
+        return len(self._haystacks)
+
+    @staticmethod
+    def _norm(value):
+        return "" if value is MISSING else str(value).lower()
+
+    def _keys(self, store):
+        # If search_keys is provided, search specifically, otherwise all keys
+        return self.keys if self.keys else list(store.keys)
+
+    def build(self, store):
+        self._haystacks = []
+        self.extend(store, 0)
+
+    def extend(self, store, start):
+        """Indexes the rows from position start to the end of the store."""
+        # Column by column, so each category is lower-cased once, not per row
+        columns = []
+        for k in self._keys(store):
+            col = store.column(k)
+            if col is None:
+                continue
+            if col.kind == "category":
+                lowered = [self._norm(v) for v in col.categories]
+                columns.append([lowered[c] for c in col.codes[start:]])
+            else:
+                columns.append([self._norm(v) for v in col.values[start:]])
+        if columns:
+            self._haystacks.extend(self.SEP.join(parts) for parts in zip(*columns))
+        else:
+            self._haystacks.extend([""] * (len(store) - start))
+
+    def update(self, store, i):
+        hay = self.SEP.join(self._norm(store.get(i, k, MISSING)) for k in self._keys(store))
+        if i < len(self._haystacks):
+            self._haystacks[i] = hay
+        else:
+            self._haystacks.append(hay)
+
+    def remove(self, i):
+        # Copy rather than delete in place: a search running on a worker
+        # thread keeps reading the list it started with
+        self._haystacks = self._haystacks[:i] + self._haystacks[i + 1:]
+
+    def keep(self, mask):
+        """Drops the rows whose mask entry is 0, like ColumnStore.keep()."""
+        self._haystacks = list(compress(self._haystacks, mask))
+
+    def matches(self, query, i):
+        return not query or query in self._haystacks[i]
+
+    def search(self, query, rows, cancelled=None):
+        """
+        Returns the row positions in rows whose text matches query, in order.
+        Safe to run off the UI thread: the index is only read, and
+        cancelled() is polled every few thousand rows; the search returns
+        None once it reports True.
+        """
+        haystacks = self._haystacks
+        matches = array("l")
+        for n, i in enumerate(rows):
+            if cancelled is not None and n % 4096 == 0 and cancelled():
+                return None
+            if query in haystacks[i]:
+                matches.append(i)
+        return matches
+
+class SortIndex(object):
+    """
+    Cached sort orders over a ColumnStore. Each column is ranked once (equal
+    values share a rank); the ascending permutation falls out of that, the
+    descending one is derived from it without another sort, and multi-column
+    orders sort by rank tuples. Category columns are ranked per category and
+    bucketed, without sorting rows at all. Call reset() whenever the dataset
+    changes, or extend() when rows were only appended.
+
+    Ranks are spaced GAP apart, so values first seen in appended rows can be
+    ranked between their neighbours without re-ranking the rows before.
+    """
+    GAP = 1 << 20
+
+    def __init__(self):
+        self.store = None
+        self._ranks = {}      # key -> rank per row position
+        self._levels = {}     # key -> (sorted distinct sort keys, their ranks, key -> rank)
+        self._perms = {}      # spec -> permutation of row positions
+
+    def reset(self, store):
+        self.store = store
+        self._ranks = {}
+        self._levels = {}
+        self._perms = {}
+
+    @staticmethod
+    def sort_key(value):
+        # Numbers, then dates, then text (case-insensitive), then empty values
+        if value is None or value is MISSING or value == "":
+            return (3, "")
+        if isinstance(value, numbers.Number):
+            return (0, value)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return (1, value)
+        return (2, str(value).lower())
+
+    def _spaced_ranks(self, values, order):
+        ranks = [0] * len(values)
+        levels, level_ranks = [], []
+        rank, prev = -self.GAP, None
+        for i in order:
+            if not levels or values[i] != prev:
+                rank += self.GAP
+                prev = values[i]
+                levels.append(prev)
+                level_ranks.append(rank)
+            ranks[i] = rank
+        return ranks, (levels, level_ranks, dict(zip(levels, level_ranks)))
+
+    def ranks(self, key):
+        ranks = self._ranks.get(key)
+        if ranks is not None:
+            return ranks
+        n = len(self.store)
+        col = self.store.column(key)
+        if col is None:
+            ranks = array("q", [0]) * n
+            order = array("l", range(n))
+            levels = ([], [], {})
+        elif col.kind == "category":
+            values = [self.sort_key(v) for v in col.categories]
+            cat_ranks, levels = self._spaced_ranks(
+                values, sorted(range(len(values)), key=values.__getitem__))
+            ranks = array("q", [cat_ranks[c] for c in col.codes])
+            # Counting sort: bucket row positions by rank
+            bucket_of = dict((r, b) for b, r in enumerate(levels[1]))
+            buckets = [[] for _ in levels[1]]
+            for i, r in enumerate(ranks):
+                buckets[bucket_of[r]].append(i)
+            order = array("l")
+            for bucket in buckets:
+                order.extend(bucket)
+        else:
+            values = [self.sort_key(v) for v in col.values]
+            order = array("l", sorted(range(n), key=values.__getitem__))
+            row_ranks, levels = self._spaced_ranks(values, order)
+            ranks = array("q", row_ranks)
+        self._ranks[key] = ranks
+        self._levels[key] = levels
+        self._perms[((key, False),)] = order
+        return ranks
+
+    def extend(self):
+        """
+        Ranks the rows appended to the store since the ranks were built,
+        leaving the earlier rows' ranks as they are. Returns False (after a
+        reset()) if a gap between two ranks ran out; the caller then has to
+        sort from scratch.
+        """
+        self._perms = {}
+        n = len(self.store)
+        for key, ranks in list(self._ranks.items()):
+            start = len(ranks)
+            if start == n:
+                continue
+            col = self.store.column(key)
+            if col is None:
+                values = [self.sort_key(MISSING)] * (n - start)
+            elif col.kind == "category":
+                keys = [self.sort_key(v) for v in col.categories]
+                values = [keys[c] for c in col.codes[start:]]
+            else:
+                values = [self.sort_key(v) for v in col.values[start:]]
+            levels, level_ranks, rank_of = self._levels[key]
+            fresh = sorted(set(v for v in values if v not in rank_of))
+            if fresh:
+                merged, merged_ranks = [], []
+                lo = 0
+                # New values between the same two neighbours share their gap
+                groups = OrderedDict()
+                for v in fresh:
+                    groups.setdefault(bisect.bisect_left(levels, v), []).append(v)
+                for at, group in groups.items():
+                    below = level_ranks[at - 1] if at > 0 else None
+                    above = level_ranks[at] if at < len(levels) else None
+                    if below is None:
+                        below = (above if above is not None else 0) - self.GAP * (len(group) + 1)
+                    if above is None:
+                        above = below + self.GAP * (len(group) + 1)
+                    step = (above - below) // (len(group) + 1)
+                    if step < 1:
+                        self.reset(self.store)
+                        return False
+                    merged.extend(levels[lo:at])
+                    merged_ranks.extend(level_ranks[lo:at])
+                    for j, v in enumerate(group, 1):
+                        rank_of[v] = below + step * j
+                        merged.append(v)
+                        merged_ranks.append(rank_of[v])
+                    lo = at
+                merged.extend(levels[lo:])
+                merged_ranks.extend(level_ranks[lo:])
+                self._levels[key] = (merged, merged_ranks, rank_of)
+            ranks.extend(array("q", [rank_of[v] for v in values]))
+        return True
+
+    def forget(self, keys):
+        """Drops the ranks and orders involving any of keys, whose values changed."""
+        keys = set(keys)
+        for key in keys:
+            self._ranks.pop(key, None)
+            self._levels.pop(key, None)
+        self._perms = dict((spec, perm) for spec, perm in self._perms.items()
+                           if not any(key in keys for key, desc in spec))
+
+    def row_key(self, spec):
+        """A function of row position that orders rows by spec (ties aside)."""
+        # Called per comparison when merging, so the common shapes are unrolled
+        columns = [(-1 if desc else 1, self.ranks(key)) for key, desc in spec]
+        if len(columns) == 1:
+            sign, ranks = columns[0]
+            return ranks.__getitem__ if sign > 0 else (lambda i: -ranks[i])
+        if len(columns) == 2:
+            (s1, r1), (s2, r2) = columns
+            return lambda i: (s1 * r1[i], s2 * r2[i])
+        return lambda i: tuple([s * r[i] for s, r in columns])
+
+    def permutation(self, spec):
+        """Row positions ordered by spec, a tuple of (key, descending)."""
+        spec = tuple(spec)
+        perm = self._perms.get(spec)
+        if perm is not None:
+            return perm
+        if len(spec) == 1:
+            key, descending = spec[0]
+            ranks = self.ranks(key)
+            asc = self._perms.get(((key, False),))
+            if asc is None:
+                # Ranks kept through extend(); only the order is rebuilt
+                asc = array("l", sorted(range(len(self.store)), key=ranks.__getitem__))
+                self._perms[((key, False),)] = asc
+            if not descending:
+                return asc
+            # Walk the ascending order backwards one tie group at a time so
+            # equal values keep their original relative order.
+            perm = array("l")
+            end = len(asc)
+            while end > 0:
+                start = end - 1
+                while start > 0 and ranks[asc[start - 1]] == ranks[asc[end - 1]]:
+                    start -= 1
+                perm.extend(asc[start:end])
+                end = start
+        else:
+            perm = array("l", sorted(range(len(self.store)), key=self.row_key(spec)))
+        self._perms[spec] = perm
+        return perm
+
+    def order(self, subset, spec):
+        """Returns the row positions in subset ordered by spec."""
+        n = len(self.store)
+        if len(subset) * 16 < n:
+            # Small subsets: sorting them by rank beats a pass over everything
+            return array("l", sorted(subset, key=self.row_key(spec)))
+        perm = self.permutation(spec)
+        if len(subset) == n:
+            return array("l", perm)
+        wanted = bytearray(n)
+        for i in subset:
+            wanted[i] = 1
+        return array("l", [i for i in perm if wanted[i]])
+
+class KeyIndex(object):
+    """
+    Row position per key_field value (the first row wins on duplicates).
+    Removing a row moves every later row up one; instead of rewriting all
+    those positions, the removed ones are kept in a sorted list and
+    subtracted on lookup, so adds, removals and lookups stay O(log n).
+    """
+    def __init__(self, values):
+        self._pos = {}
+        for pos in range(len(values) - 1, -1, -1):
+            self._pos[values[pos]] = pos
+        self._removed = []
+
+    def __len__(self):
+        return len(self._pos)
+
+    def get(self, key):
+        pos = self._pos.get(key)
+        if pos is None:
+            return None
+        return pos - bisect.bisect_left(self._removed, pos)
+
+    def add(self, key, pos):
+        """Indexes the row appended at position pos."""
+        if key not in self._pos:
+            # Stored as if no row had been removed, like the others
+            self._pos[key] = pos + len(self._removed)
+
+    def remove(self, key):
+        bisect.insort(self._removed, self._pos.pop(key))
+
+class _RowSlot(object):
+    """Canvas items backing one visible row; reused as pages and data change."""
+    def __init__(self):
+        self.row = -1          # index into filtered currently shown, -1 if hidden
+        self.btn_count = 0
+        self.cells = []        # [(rect, text)] per data column
+        self.action_rect = None
+        self.buttons = []      # [(rect, text)] per action button
+        self.actions = ()      # button descriptors of the row shown
+        self.button_spans = [] # [(x1, x2)] of the buttons shown, for hit-testing
+        self.button_top = 0
+        self.button_bottom = 0
+
+    def items(self):
+        items = []
+        for rect, text in self.cells:
+            items.extend((rect, text))
+        items.append(self.action_rect)
+        for rect, text in self.buttons:
+            items.extend((rect, text))
+        return items
+
 class CanvasDataTable(ttk.Frame):
     """
     A reusable, highly performant table component using tk.Canvas.
@@ -27,6 +453,8 @@ class CanvasDataTable(ttk.Frame):
     - Smooth scrolling
     - Cell copying to clipboard
     - Integrated Search & Pagination
+    - Optional virtual scrolling over the whole filtered set
+    - Optional server-side paging through a PagedDataProvider
     - Custom Action Buttons
     """
     def __init__(self, parent, 
@@ -38,7 +466,17 @@ class CanvasDataTable(ttk.Frame):
                  get_action_buttons_func=None,
                  search_placeholder="Search records...",
                  search_keys=None,
-                 cell_formatters=None):
+                 cell_formatters=None,
+                 virtual_scroll=False,
+                 overscan=4,
+                 frame_budget_ms=16,
+                 search_delay_ms=150,
+                 async_search_threshold=20000,
+                 data_provider=None,
+                 page_cache_size=16,
+                 key_field=None,
+                 fresh_ttl=0,
+                 invalidate_func=None):
         
         ttk.Frame.__init__(self, parent, style="Card.TFrame", padding=25)
         
@@ -47,24 +485,116 @@ class CanvasDataTable(ttk.Frame):
         self.col_widths = initial_widths or [100, 200, 150]
         self.page_size = page_size
         self.fetch_data_func = fetch_data_func
+        # Called on a forced refresh to drop whatever fetch_data_func reads
+        # from a cache (the provider equivalent is data_provider.invalidate)
+        self.invalidate_func = invalidate_func
         self.get_action_buttons_func = get_action_buttons_func
         self.search_placeholder = search_placeholder
         self.search_keys = search_keys or []
         self.cell_formatters = cell_formatters or {} # col_idx -> func
+        # Virtual scroll: the scrollbar spans all filtered rows and only the
+        # rows in view (plus `overscan` on either side) have canvas items.
+        self.virtual_scroll = virtual_scroll
+        self.overscan = overscan
+        # Minimum time between two paints; bursts of events in between are
+        # collapsed into a single flush of whatever regions they dirtied.
+        self.frame_budget_ms = frame_budget_ms
+        # Keystrokes within search_delay_ms of each other run a single search
+        self.search_delay_ms = search_delay_ms
+        # Searches over at least this many rows run on a worker thread
+        self.async_search_threshold = async_search_threshold
+        # With a data_provider, self.data/self.filtered only hold the current
+        # page; paging, search and count are pushed down to the provider.
+        # Virtual scrolling is not available in this mode.
+        self.data_provider = data_provider
+        if data_provider is not None:
+            self.virtual_scroll = False
         
+        # Primary key of the records, for upsert() and remove()
+        self.key_field = key_field
+        self._key_index = None      # KeyIndex, built on first use
+
+        # Formatter output and action buttons per row position; entries carry
+        # the row version so edits (invalidate_rows, RowView writes) never hit.
+        self._format_cache = LRUCache(8192)
+        self._button_cache = LRUCache(4096)
+
+        # self.data is a ColumnStore (assigning a list of dicts converts it);
+        # self.filtered is an array of row positions into it, in display order.
         self.data = []
-        self.filtered = []
+        self.filtered = array("l")
         self.current_page = 0
         self.is_loading = False
+        # refresh() is a no-op for fresh_ttl seconds after a completed load
+        # (the Refresh button always reloads); a refresh bumps _load_gen and
+        # results of older ones are dropped.
+        self.fresh_ttl = fresh_ttl
+        self._loaded_at = None
+        self._load_gen = 0
+        self._last_query = None     # query that produced self.filtered
+        self.search_index = SearchIndex(self.search_keys)
+        self._search_gen = 0        # bumped per search; stale results are dropped
+        self._search_running = False
+        self.sort_spec = []         # [(col_idx, descending)], primary first
+        self.sort_index = SortIndex()
+
+        # Provider paging state
+        self._page_rows = LRUCache(page_cache_size)  # page -> rows, current query
+        self._page_after = {0: None}  # page -> key of the last row before it
+        self._page_pending = False    # a page fetch for _page_gen is in flight
+        self._provider_total = 0
+        self._provider_epoch = 0      # bumped when query or data is reset
+        self._page_gen = 0            # bumped per page request
+        self._search_after_id = None
+        self._search_trace = tracing.NULL_TRACE  # trace waiting on the debounce
         self.row_height = 42
+        self.header_height = 38
+
+        # Retained canvas items: created once, then updated in place on redraw
+        self._header_items = []   # [(rect, text, separator)] per column
+        self._row_slots = []      # [_RowSlot] per visible row
+        self._item_opts = {}      # item id -> last options passed to itemconfig
+        self._item_coords = {}    # item id -> last coords
+        self._slot_of_row = {}    # row index -> slot index currently showing it
+        self._col_edges = []      # cumulative right edge of each column
+        self._col_edges_key = None
+        self._raise_header = False
+        self._scrollregion = None
+
+        # Redraw scheduling: regions are "header", "rows", "status", "hover"
+        # and "changed"
+        self._dirty = set()
+        self._dirty_rows = set()  # rows needing a hover restyle only
+        self._changed_rows = set()  # rows to repaint after upsert()/remove()
+        self._redraw_id = None
+        self._last_paint = 0.0
+        self._format_time = 0.0   # seconds spent in cell formatters since the last paint
+        self._format_calls = 0
         
         self.hover_row = -1
         self.hover_button = -1
         self.dragging_col = -1
+        self._truncator = TextTruncator(self)
+        self._button_layouts = LRUCache(256)   # (count, column width) -> spans
         
         self._build_ui()
         self.update_idletasks()
         self._stretch_last_column()
+        self._schedule_redraw("header", "rows", "status")
+
+    @property
+    def data(self):
+        return self._store
+
+    @data.setter
+    def data(self, records):
+        if not isinstance(records, ColumnStore):
+            records = ColumnStore.from_records(records)
+        self._store = records
+        # Row positions now refer to different rows
+        self._format_cache.clear()
+        self._button_cache.clear()
+        self._key_index = None
 
     def _stretch_last_column(self):
         fixed = sum(self.col_widths[:-1])
@@ -84,7 +614,7 @@ class CanvasDataTable(ttk.Frame):
         
         # Action Buttons for Header (optional, usually Refresh)
         self.refresh_btn = ttk.Button(header, text="Refresh", style="Flat.TButton",
-                                      command=self.refresh)
+                                      command=self._on_refresh_click)
         self.refresh_btn.pack(side="left", padx=20)
 
         # Search
@@ -96,6 +626,12 @@ class CanvasDataTable(ttk.Frame):
                                      highlightcolor=styles.PRIMARY,
                                      fg=styles.SECONDARY)
         self.search_entry.pack(side="right", ipady=6)
+        self.searching_label = tk.Label(header, text="Searching…",
+                                        font=("Segoe UI", 9), fg=styles.SECONDARY,
+                                        bg=styles.LIGHT)
+        self.progress_label = tk.Label(header, text="",
+                                       font=("Segoe UI", 9), fg=styles.SECONDARY,
+                                       bg=styles.LIGHT)
         self.search_entry.insert(0, self.search_placeholder)
         self.search_entry.bind("<FocusIn>", self._clear_placeholder)
         self.search_entry.bind("<FocusOut>", self._restore_placeholder)
@@ -115,7 +651,9 @@ class CanvasDataTable(ttk.Frame):
         self.vsb = ttk.Scrollbar(table_frame, orient="vertical", command=self.canvas.yview)
         self.hsb = ttk.Scrollbar(table_frame, orient="horizontal", command=self.canvas.xview)
         
-        self.canvas.configure(yscrollcommand=self.vsb.set, xscrollcommand=self.hsb.set)
+        self.canvas.configure(yscrollcommand=self._on_yview, xscrollcommand=self.hsb.set)
+        if self.virtual_scroll:
+            self.canvas.configure(yscrollincrement=self.row_height)
         
         self.canvas.grid(row=0, column=0, sticky="nsew")
         self.vsb.grid(row=0, column=1, sticky="ns")
@@ -139,7 +677,8 @@ class CanvasDataTable(ttk.Frame):
         pager.pack_propagate(False)
         
         nav_frame = tk.Frame(pager, bg=styles.LIGHT)
-        nav_frame.place(relx=0.5, rely=0.5, anchor="center")
+        if not self.virtual_scroll:
+            nav_frame.place(relx=0.5, rely=0.5, anchor="center")
         
         ttk.Button(nav_frame, text="◀ Previous", style="Flat.TButton",
                    command=self._prev_page).pack(side="left", padx=10)
@@ -159,9 +698,14 @@ class CanvasDataTable(ttk.Frame):
                                       font=("Segoe UI", 9, "bold"), padx=8, pady=4)
         self.copy_feedback_id = None
 
+    def _on_yview(self, first, last):
+        self.vsb.set(first, last)
+        if self.virtual_scroll:
+            self._schedule_redraw("header", "rows", "status")
+
     def _on_canvas_configure(self, event):
         self._stretch_last_column()
-        self._redraw_table()
+        self._schedule_redraw("header", "rows", "status")
 
     def _clear_placeholder(self, event):
         if self.search_entry.get() == self.search_placeholder:
@@ -203,195 +747,1281 @@ class CanvasDataTable(ttk.Frame):
         except:
             pass
 
-    def refresh(self):
-        if self.is_loading: return
+    def _on_refresh_click(self):
+        trace = tracing.tracer.start("refresh", table=self.title)
+        self.refresh(force=True)
+        self._settle_trace(trace)
+
+    def is_fresh(self):
+        """True while the last completed load is younger than fresh_ttl."""
+        return (self._loaded_at is not None
+                and time.monotonic() - self._loaded_at < self.fresh_ttl)
+
+    def refresh(self, force=False):
+        """
+        Reloads the data. Rows already on screen stay up while the new ones
+        load, and a newer refresh supersedes one still in flight. Without
+        force, nothing is fetched while the data is younger than fresh_ttl
+        or while a load is still in flight (page switches during a slow first
+        load must not restart it); with it, cached query results are dropped
+        first and any load in flight is superseded.
+        """
+        if not force:
+            if self.is_fresh():
+                tracing.tracer.current().mark("fresh")
+                return
+            if self._load_in_flight():
+                tracing.tracer.current().mark("in_flight")
+                return
+        self._load_gen += 1
+        if force:
+            if self.data_provider is not None:
+                self.data_provider.invalidate()
+            elif self.invalidate_func is not None:
+                self.invalidate_func()
+        if self.data_provider is not None:
+            self._provider_revalidate()
+            return
         self.is_loading = True
-        self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
-        thread = threading.Thread(target=self._load_data_thread, daemon=True)
-        self.canvas.yview_moveto(0)
+        # The first load streams into view; later ones swap in when complete
+        progressive = self._loaded_at is None
+        if progressive:
+            self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
+            self.canvas.yview_moveto(0)
+        else:
+            self._set_progress("Refreshing…")
+        trace = tracing.tracer.current()
+        trace.hold()
+        thread = threading.Thread(target=self._load_data_thread,
+                                  args=(self._load_gen, progressive, trace), daemon=True)
         thread.start()
 
-    def _load_data_thread(self):
-        if self.fetch_data_func:
-            data = self.fetch_data_func()
-            self.after(0, lambda: self._on_data_ready(data))
+    def _load_in_flight(self):
+        if self.data_provider is not None:
+            return self._page_pending
+        return self.is_loading
+
+    def _load_data_thread(self, gen, progressive, trace):
+        with tracing.tracer.bind(trace):
+            data = []
+            if self.fetch_data_func:
+                try:
+                    with trace.span("fetch"):
+                        data = self.fetch_data_func()
+                except Exception as e:
+                    print("Error loading data: {}".format(e))
+                    self.after(0, lambda: self._on_load_failed(gen, trace))
+                    return
+                if data is not None and not isinstance(data, (list, tuple)):
+                    self._stream_chunks(data, gen, progressive, trace)
+                    return
+            self.after(0, lambda: self._on_data_ready(data, trace, gen))
+
+    def _stream_chunks(self, chunks, gen, progressive, trace):
+        """
+        fetch_data_func returned an iterator of row lists (e.g. a generator
+        reading the result set in batches). When progressive, each chunk is
+        handed to the UI thread as it arrives so the first page paints before
+        the fetch completes; otherwise the rows are collected and swapped in
+        at the end. Stops early once a newer refresh has started.
+
+        An error part way through fails the load: the rows collected so far
+        are dropped rather than reconciled, since a cut-short result would
+        look like rows were deleted.
+        """
+        first = True
+        rows = []
+        chunks = iter(chunks)
+        while gen == self._load_gen:
+            try:
+                with trace.span("fetch_chunk"):
+                    chunk = next(chunks, None)
+            except Exception as e:
+                print("Error loading data: {}".format(e))
+                self.after(0, lambda: self._on_load_failed(gen, trace))
+                return
+            if chunk is None:
+                break
+            if not progressive:
+                rows.extend(chunk)
+                continue
+            chunk = list(chunk)
+            self.after(0, lambda c=chunk, f=first: self._on_chunk(c, f, gen, trace))
+            first = False
+        else:
+            # Superseded: let a generator release its cursor
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        if first:
+            self.after(0, lambda: self._on_data_ready(rows, trace, gen))
         else:
-            self.after(0, lambda: self._on_data_ready([]))
+            self.after(0, lambda: self._on_stream_done(gen, trace))
 
-    def _on_data_ready(self, data):
-        self.data = data
-        self.is_loading = False
+    def _on_data_ready(self, data, trace=tracing.NULL_TRACE, gen=None):
+        if gen is None or gen == self._load_gen:
+            with tracing.tracer.bind(trace):
+                if self.key_field is not None and self._loaded_at is not None:
+                    self.reconcile(data)
+                else:
+                    self._show_loaded(data)
+            self._load_finished()
+        self._release_trace(trace)
+
+    def _show_loaded(self, data):
+        with tracing.tracer.span("process", rows=len(data)):
+            self.data = data
+            self.search_index.build(self.data)
+            self.sort_index.reset(self.data)
         self.loading_label.place_forget()
         self._apply_search()
 
-    def _apply_search(self):
+    def _on_chunk(self, chunk, first, gen, trace):
+        if gen != self._load_gen:
+            return
+        with tracing.tracer.bind(trace):
+            if first:
+                trace.mark("first_chunk", rows=len(chunk))
+                self._show_loaded(chunk)
+            else:
+                self._append_rows(chunk)
+        self._set_progress("Loading… {:,} rows".format(len(self.data)))
+
+    def _on_stream_done(self, gen, trace):
+        if gen == self._load_gen:
+            self._load_finished()
+        self._release_trace(trace)
+
+    def _load_finished(self):
+        self.is_loading = False
+        self._loaded_at = time.monotonic()
+        self._set_progress(None)
+
+    def _on_load_failed(self, gen, trace):
+        # Keep whatever is on screen; the next refresh tries again
+        if gen == self._load_gen:
+            self.is_loading = False
+            self.loading_label.place_forget()
+            self._set_progress(None)
+        self._release_trace(trace)
+
+    def _append_rows(self, records):
+        """Adds rows to the end of the dataset, keeping the page and scroll position."""
+        with tracing.tracer.span("append", rows=len(records)):
+            start = len(self.data)
+            self.data.extend(records)
+            self.search_index.extend(self.data, start)
+            self._index_keys(start)
+            # Only the new rows are ranked; the rest keep theirs
+            extended = self.sort_index.store is self.data and self.sort_index.extend()
+            if not extended:
+                self.sort_index.reset(self.data)
+            if self._search_running:
+                # The running search only covers the rows it started with
+                self._apply_search()
+                return
+            new = range(start, len(self.data))
+            if self._last_query:
+                new = self.search_index.search(self._last_query, new)
+            if self.sort_spec and extended:
+                self.filtered = self._merge_rows(new)
+            elif self.sort_spec:
+                self.filtered = self.sort_index.order(self.filtered + array("l", new),
+                                                      self._sort_keys())
+            else:
+                self.filtered.extend(new)
+        self._schedule_redraw("rows", "status")
+
+    def _merge_rows(self, new):
+        """
+        self.filtered with the row positions in new (all past the rows it
+        holds) merged in at their sorted places. Only the new rows are
+        sorted; each is then placed by a binary search, so a chunk costs
+        O(k log n) comparisons and one copy of filtered.
+        """
+        key = self.sort_index.row_key(self._sort_keys())
+        filtered = self.filtered
+        merged = array("l")
+        lo = 0
+        # Stable sort and bisect_right: ties stay in position order
+        for pos in sorted(new, key=key):
+            at = bisect.bisect_right(filtered, key(pos), lo, key=key)
+            merged.extend(filtered[lo:at])
+            merged.append(pos)
+            lo = at
+        merged.extend(filtered[lo:])
+        return merged
+
+    def _set_progress(self, text):
+        """Shows a load in progress next to the search box; None hides it."""
+        if text is None:
+            self.progress_label.pack_forget()
+        else:
+            self.progress_label.config(text=text)
+            self.progress_label.pack(side="right", padx=8)
+
+    def _release_trace(self, trace):
+        """Drops a hold on trace, ending it now if there is no frame left to paint."""
+        trace.release()
+        self._settle_trace(trace)
+
+    def _settle_trace(self, trace):
+        if self._redraw_id is None:
+            trace.frame_painted()
+
+    def _current_query(self):
         query = self.search_var.get().lower().strip()
-        if query in ("", self.search_placeholder.lower()):
-            self.filtered = list(self.data)
+        if query == self.search_placeholder.lower():
+            return ""
+        return query
+
+    def _apply_search(self, refine=False):
+        """
+        Filters self.data by the search box. With refine=True (typing), a query
+        that extends the previous one only re-filters the previous results;
+        anything else, including edits to self.data, rescans the full dataset.
+        """
+        query = self._current_query()
+        # Any newer search supersedes one still running on the worker
+        self._search_gen += 1
+        self._set_searching(False)
+        if refine and query == self._last_query:
+            return
+        if self.data_provider is not None:
+            self._last_query = query
+            self._provider_reset(query)
+            return
+        self._ensure_indexes()
+        if not query:
+            self._set_filtered(query, array("l", range(len(self.data))))
+            return
+
+        source = range(len(self.data))
+        presorted = False
+        if refine and self._last_query and self._last_query in query:
+            # Filtering keeps the order, so refined results stay sorted
+            source = self.filtered
+            presorted = True
+        trace = tracing.tracer.current()
+        if len(source) < self.async_search_threshold:
+            with trace.span("search", rows=len(source)):
+                filtered = self.search_index.search(query, source)
+            self._set_filtered(query, filtered, presorted)
+            return
+
+        self._set_searching(True)
+        trace.hold()
+        thread = threading.Thread(target=self._search_thread,
+                                  args=(self._search_gen, query, array("l", source),
+                                        presorted, trace),
+                                  daemon=True)
+        thread.start()
+
+    def _search_thread(self, gen, query, snapshot, presorted, trace):
+        with trace.span("search", rows=len(snapshot)):
+            filtered = self.search_index.search(query, snapshot,
+                                                lambda: gen != self._search_gen)
+        self.after(0, lambda: self._on_search_done(gen, query, filtered, presorted, trace))
+
+    def _on_search_done(self, gen, query, filtered, presorted, trace):
+        if filtered is not None and gen == self._search_gen:
+            self._set_searching(False)
+            with tracing.tracer.bind(trace):
+                self._set_filtered(query, filtered, presorted)
+        self._release_trace(trace)
+
+    def _set_searching(self, searching):
+        self._search_running = searching
+        if searching:
+            self.searching_label.pack(side="right", padx=8)
         else:
-            self.filtered = []
-            for d in self.data:
-                match = False
-                # If search_keys is provided, search specifically, otherwise all keys
-                keys = self.search_keys if self.search_keys else d.keys()
-                for k in keys:
-                    if query in str(d.get(k, "")).lower():
-                        match = True
-                        break
-                if match:
-                    self.filtered.append(d)
+            self.searching_label.pack_forget()
+
+    def _provider_reset(self, query):
+        self._provider_epoch += 1
+        self._page_rows.clear()
+        self._page_after = {0: None}
+        self._show_provider_page(0)
+
+    def _show_provider_page(self, page):
+        rows = self._page_rows.get(page)
+        self._page_gen += 1
+        self._page_pending = False
+        trace = tracing.tracer.current()
+        if rows is not None:
+            trace.mark("page_cache_hit", page=page)
+            trace.hold()
+            self._on_provider_page(self._page_gen, self._provider_epoch, page, rows,
+                                   self._provider_total, trace)
+            return
+        if page not in self._page_after:
+            return
+        if len(self.data):
+            # Keep the rows on screen until the new page is in
+            self._set_progress("Loading…")
+        else:
+            self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
+        self._page_pending = True
+        trace.hold()
+        thread = threading.Thread(target=self._provider_thread,
+                                  args=(self._page_gen, self._provider_epoch, page,
+                                        self._current_query(), self._page_after[page], trace),
+                                  daemon=True)
+        thread.start()
+
+    def _provider_sort(self):
+        """The primary sort as pushed down to the provider, if it can take it."""
+        if not self.sort_spec:
+            return None
+        col_idx, descending = self.sort_spec[0]
+        key = self._sort_key_of(col_idx)
+        if key not in getattr(self.data_provider, "columns", {key: None}):
+            return None
+        return (key, descending)
+
+    def _provider_revalidate(self):
+        """
+        Refresh in provider mode: refetches the page on screen and reconciles
+        it by key_field, so the operator stays on the page they were reading.
+        Without a key_field (or before anything loaded) it starts over at
+        the first page.
+        """
+        page = self.current_page
+        if self.key_field is None or self._loaded_at is None or page not in self._page_after:
+            self._provider_reset(self._current_query())
+            return
+        self._provider_epoch += 1
+        self._page_rows.clear()
+        # Later pages start after keys that may have changed
+        self._page_after = dict((p, k) for p, k in self._page_after.items() if p <= page)
+        self._page_gen += 1
+        self._page_pending = True
+        self._set_progress("Refreshing…")
+        trace = tracing.tracer.current()
+        trace.hold()
+        thread = threading.Thread(target=self._provider_thread,
+                                  args=(self._page_gen, self._provider_epoch, page,
+                                        self._current_query(), self._page_after[page], trace,
+                                        self._on_provider_refresh),
+                                  daemon=True)
+        thread.start()
+
+    def _on_provider_refresh(self, gen, epoch, page, rows, total, trace=tracing.NULL_TRACE):
+        if gen == self._page_gen:
+            self._page_pending = False
+        if gen != self._page_gen or epoch != self._provider_epoch:
+            self._release_trace(trace)
+            return
+        self._set_progress(None)
+        if not rows and page > 0:
+            # The page emptied out (rows deleted before it): start over
+            self._provider_reset(self._current_query())
+            self._release_trace(trace)
+            return
+        self._loaded_at = time.monotonic()
+        self._store_provider_page(page, rows)
+        self._provider_total = total
+        with tracing.tracer.bind(trace):
+            self.reconcile(rows)
+        self._prefetch_provider_page(page + 1)
+        self._release_trace(trace)
+
+    def _provider_thread(self, gen, epoch, page, query, after_key, trace, done=None):
+        with tracing.tracer.bind(trace):
+            try:
+                with trace.span("fetch", page=page):
+                    rows = self.data_provider.fetch_page(query, after_key, self.page_size,
+                                                         self._provider_sort())
+                    total = self.data_provider.count(query)
+            except Exception as e:
+                print("Error fetching page: {}".format(e))
+                self.after(0, lambda: self._on_provider_failed(gen, trace))
+                return
+        done = done or self._on_provider_page
+        self.after(0, lambda: done(gen, epoch, page, rows, total, trace))
+
+    def _on_provider_failed(self, gen, trace):
+        # Keep the page on screen, and not fresh: the next refresh tries again
+        if gen == self._page_gen:
+            self._page_pending = False
+            self.loading_label.place_forget()
+            self._set_progress(None)
+        self._release_trace(trace)
+
+    def _on_provider_page(self, gen, epoch, page, rows, total, trace=tracing.NULL_TRACE):
+        if gen == self._page_gen:
+            self._page_pending = False
+        if gen != self._page_gen or epoch != self._provider_epoch:
+            self._release_trace(trace)
+            return
+        self.loading_label.place_forget()
+        self._set_progress(None)
+        self._loaded_at = time.monotonic()
+        self._store_provider_page(page, rows)
+        self._provider_total = total
+        self.current_page = page
+        self.data = rows
+        self.search_index.build(self.data)
+        self.sort_index.reset(self.data)
+        positions = array("l", range(len(self.data)))
+        # Already in the server's order (see _provider_sort)
+        self.filtered = positions
+        self.canvas.yview_moveto(0)
+        self._schedule_redraw("rows", "status")
+        self._prefetch_provider_page(page + 1)
+        self._release_trace(trace)
+
+    def _store_provider_page(self, page, rows):
+        self._page_rows.put(page, rows)
+        if rows:
+            self._page_after[page + 1] = self.data_provider.key_of(rows[-1],
+                                                                   self._provider_sort())
+
+    def _prefetch_provider_page(self, page):
+        """Loads the page after the current one in the background."""
+        if (self._page_rows.get(page) is not None or page not in self._page_after
+                or page * self.page_size >= self._provider_total):
+            return
+        epoch, query, after_key = self._provider_epoch, self._current_query(), self._page_after[page]
+
+        sort = self._provider_sort()
+
+        def prefetch():
+            try:
+                rows = self.data_provider.fetch_page(query, after_key, self.page_size, sort)
+            except Exception as e:
+                print("Error prefetching page: {}".format(e))
+                return
+            self.after(0, lambda: self._on_page_prefetched(epoch, page, rows))
+
+        threading.Thread(target=prefetch, daemon=True).start()
+
+    def _on_page_prefetched(self, epoch, page, rows):
+        if epoch == self._provider_epoch:
+            self._store_provider_page(page, rows)
+
+    def _set_filtered(self, query, filtered, presorted=False):
+        if self.sort_spec and not presorted:
+            with tracing.tracer.span("sort", rows=len(filtered)):
+                filtered = self.sort_index.order(filtered, self._sort_keys())
+        self.filtered = filtered
+        self._last_query = query
         self.current_page = 0
         self.canvas.yview_moveto(0)
-        self._redraw_table()
+        self._schedule_redraw("rows", "status")
+
+    def invalidate_rows(self, records):
+        """
+        Call with the rows (RowViews from self.data) after editing them in
+        place so search, sort and paint pick up the change.
+        """
+        for d in records:
+            self.data.touch(d.index)
+            self.search_index.update(self.data, d.index)
+        # Sort ranks may be stale; cached orders are rebuilt on the next sort
+        self.sort_index.reset(self.data)
+        self._schedule_redraw("rows")
+
+    def upsert(self, key, record):
+        """
+        Updates the row whose key_field equals key with the fields in record,
+        or adds record as a new row if there is none. The row moves in or out
+        of the current search results and sort order as needed; the page and
+        scroll position are kept and only the rows that changed are repainted.
+        Returns the row (a RowView).
+        """
+        pos = self._row_of_key(key)
+        if pos is None:
+            if self.data_provider is not None:
+                return None  # its place is on the server; the next page load shows it
+            record = dict(record)
+            record[self.key_field] = key
+            pos = self.data.append(record)
+            self.search_index.update(self.data, pos)
+            self._index_keys(pos)
+            self.sort_index.extend()
+            old_row = None
+        else:
+            for k, v in record.items():
+                self.data.set(pos, k, v)
+            self.search_index.update(self.data, pos)
+            if record.get(self.key_field, key) != key:
+                self._key_index = None
+            self.sort_index.forget(record.keys())
+            old_row = self._display_row_of(pos)
+        self._patch_cached_page(key, record)
+
+        if self.data_provider is not None:
+            # Server pages keep their order; just repaint the row in place
+            new_row = old_row
+        else:
+            if old_row is not None:
+                self.filtered.pop(old_row)
+            new_row = None
+            if self.search_index.matches(self._last_query or "", pos):
+                new_row = self._insertion_row(pos)
+                self.filtered.insert(new_row, pos)
+        self._rows_changed(old_row, new_row)
+        return self.data.row(pos)
+
+    def remove(self, key):
+        """Removes the row with this key. Returns False if there is none."""
+        pos = self._row_of_key(key)
+        if pos is None:
+            return False
+        old_row = self._display_row_of(pos)
+        self.data.delete(pos)
+        self.search_index.remove(pos)
+        self.sort_index.reset(self.data)
+        if self._key_index is not None:
+            self._key_index.remove(key)
+            if len(self._key_index) != len(self.data):
+                # Duplicate keys: another row may hold this one now
+                self._key_index = None
+        # Row positions after pos shift down by one
+        self.filtered = array("l", [i - 1 if i > pos else i
+                                    for i in self.filtered if i != pos])
+        if self.data_provider is not None:
+            self._patch_cached_page(key, None)
+            self._provider_total = max(0, self._provider_total - 1)
+            self.data_provider.invalidate()
+        self._rows_changed(old_row, None)
+        return True
+
+    def reconcile(self, records):
+        """
+        Brings self.data in line with records, a fresh copy of the whole
+        dataset, by key_field instead of replacing it: changed rows are
+        updated in place, missing ones dropped and new ones appended. Only
+        those rows are re-indexed, the page and scroll position are kept and
+        only visible rows that changed are repainted. Returns the sets of
+        (inserted, updated, removed) keys.
+
+        With a data_provider, records is a fresh copy of the current page and
+        its order (the server's) is kept.
+        """
+        with tracing.tracer.span("reconcile", rows=len(records)) as span:
+            result = self._reconcile(records)
+            if tracing.tracer.current():
+                span.attrs.update(zip(("inserted", "updated", "removed"),
+                                      (len(keys) for keys in result)))
+        return result
+
+    def _reconcile(self, records):
+        self._ensure_indexes()
+        store, key_field = self.data, self.key_field
+        first, last = self._visible_range()
+        before = [store.versions[p] for p in self.filtered[first:last]]
+
+        positions = {}
+        for pos, k in enumerate(store.column_values(key_field)):
+            positions.setdefault(k, pos)
+        inserted, updated = set(), set()
+        new_rows, changed = [], []
+        edited = set()  # fields changed in updated rows
+        seen = bytearray(len(store))
+        for record in records:
+            k = record.get(key_field, MISSING)
+            pos = positions.get(k)
+            if pos is None or seen[pos]:
+                inserted.add(k)
+                new_rows.append(record)
+                continue
+            seen[pos] = 1
+            fields = [(f, v) for f, v in record.items() if store.get(pos, f, MISSING) != v]
+            fields.extend((f, MISSING) for f in store.keys
+                          if f not in record and store.get(pos, f, MISSING) is not MISSING)
+            if fields:
+                for f, v in fields:
+                    store.set(pos, f, v)
+                    edited.add(f)
+                self.search_index.update(store, pos)
+                updated.add(k)
+                changed.append(pos)
+
+        filtered = self.filtered
+        removed = set()
+        if seen.count(0):
+            removed = set(compress(store.column_values(key_field),
+                                   (not s for s in seen)))
+            # Old position -> new position, -1 for dropped rows
+            remap = array("l", [-1]) * len(store)
+            n = 0
+            for pos, kept in enumerate(seen):
+                if kept:
+                    remap[pos] = n
+                    n += 1
+            if self._key_index is not None and len(self._key_index) == len(store):
+                for k in removed:
+                    self._key_index.remove(k)
+            else:
+                self._key_index = None  # duplicate keys; rebuilt when next needed
+            store.keep(seen)
+            self.search_index.keep(seen)
+            filtered = array("l", [remap[p] for p in filtered if remap[p] >= 0])
+            changed = [remap[p] for p in changed]
+        start = len(store)
+        if new_rows:
+            store.extend(new_rows)
+            self.search_index.extend(store, start)
+        # Cached ranks survive a revalidation that changed nothing they sort by
+        self.sort_index.forget(edited)
+        if removed:
+            self.sort_index.reset(store)
+        elif new_rows:
+            self.sort_index.extend()
+        self._index_keys(start)
+
+        if self.data_provider is not None:
+            # A provider page comes back searched and sorted by the server
+            index = {}
+            for pos, k in enumerate(store.column_values(key_field)):
+                index.setdefault(k, pos)
+            filtered = array("l", [index[r.get(key_field, MISSING)] for r in records])
+        else:
+            query = self._last_query or ""
+            reorder = bool(new_rows)
+            if changed and (query or self.sort_spec):
+                # Edited rows may have left or joined the results, or moved
+                touched = set(changed)
+                filtered = array("l", [p for p in filtered if p not in touched])
+                filtered.extend(p for p in changed if self.search_index.matches(query, p))
+                reorder = True
+            new = range(start, len(store))
+            if query:
+                new = self.search_index.search(query, new)
+            filtered.extend(new)
+            if reorder and self.sort_spec:
+                filtered = self.sort_index.order(filtered, self._sort_keys())
+            elif reorder:
+                filtered = array("l", sorted(filtered))
+        self.filtered = filtered
+
+        if self._search_running:
+            # The running search works on row positions from before
+            self._apply_search()
+        elif (self.data_provider is None and not self.virtual_scroll
+              and self.current_page * self.page_size >= max(1, len(filtered))):
+            self.current_page = max(0, (len(filtered) - 1) // self.page_size)
+            self._schedule_redraw("rows", "status")
+        else:
+            first, last = self._visible_range()
+            after = [store.versions[p] for p in filtered[first:last]]
+            for i in range(max(len(before), len(after))):
+                if i >= len(before) or i >= len(after) or before[i] != after[i]:
+                    self._changed_rows.add(first + i)
+            self._schedule_redraw("changed", "status")
+        return inserted, updated, removed
+
+    def _row_of_key(self, key):
+        """Row position of key in self.data, or None."""
+        if self.key_field is None:
+            raise ValueError("CanvasDataTable needs a key_field for keyed updates")
+        self._ensure_indexes()
+        index = self._key_index
+        if index is not None:
+            pos = index.get(key)
+            if pos is None:
+                # Appends and removals keep the index current: not a row
+                return None
+            if self.data.get(pos, self.key_field, MISSING) == key:
+                return pos
+        # Not built yet, or stale after a key was edited in place
+        self._key_index = KeyIndex(self.data.column_values(self.key_field))
+        return self._key_index.get(key)
+
+    def _index_keys(self, start):
+        """Adds the keys of the rows from position start on to the key index."""
+        index = self._key_index
+        if index is None or self.key_field is None:
+            return
+        get, key_field = self.data.get, self.key_field
+        for pos in range(start, len(self.data)):
+            index.add(get(pos, key_field, MISSING), pos)
+
+    def _ensure_indexes(self):
+        if self.sort_index.store is not self.data or len(self.search_index) != len(self.data):
+            # Rows were replaced, added or dropped behind our back; reindex
+            self.search_index.build(self.data)
+            self.sort_index.reset(self.data)
+            self._key_index = None
+
+    def _display_row_of(self, pos):
+        """Index in self.filtered of row position pos, or None if filtered out."""
+        try:
+            return self.filtered.index(pos)
+        except ValueError:
+            return None
+
+    def _insertion_row(self, pos):
+        """Where row position pos belongs in self.filtered (which must not hold it)."""
+        filtered = self.filtered
+        if not self.sort_spec:
+            return bisect.bisect_left(filtered, pos)
+        # Same order as SortIndex: by the sort keys, ties by row position
+        spec = [(k, desc) for k, desc in self._sort_keys()]
+        sort_key = SortIndex.sort_key
+        get = self.data.get
+        mine = [sort_key(get(pos, k, MISSING)) for k, desc in spec]
+
+        def before(other):
+            for (k, desc), key in zip(spec, mine):
+                theirs = sort_key(get(other, k, MISSING))
+                if theirs != key:
+                    return theirs > key if desc else theirs < key
+            return other < pos
+
+        lo, hi = 0, len(filtered)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if before(filtered[mid]):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _patch_cached_page(self, key, record):
+        """Applies a keyed edit (record None: removal) to the provider's cached page."""
+        if self.data_provider is None:
+            return
+        rows = self._page_rows.get(self.current_page)
+        if rows is None:
+            return
+        for i, row in enumerate(rows):
+            if row.get(self.key_field) == key:
+                if record is None:
+                    del rows[i]
+                else:
+                    row.update(record)
+                return
+
+    def _rows_changed(self, old_row, new_row):
+        """Schedules a repaint of the display rows an edit moved or shifted."""
+        if self._search_running:
+            # The running search works on row positions from before the edit
+            self._apply_search()
+            return
+        rows = [r for r in (old_row, new_row) if r is not None]
+        if not rows:
+            return
+        first, last = self._visible_range()
+        if old_row is not None and new_row is not None:
+            # Moved (or edited in place): only the rows in between shift
+            start, end = min(rows), max(rows) + 1
+        else:
+            # Added or dropped: everything after it shifts by one
+            start, end = rows[0], max(last, len(self.filtered)) + 1
+        if not self.virtual_scroll and self.data_provider is None:
+            pages = max(1, (len(self.filtered) + self.page_size - 1) // self.page_size)
+            if self.current_page >= pages:
+                # The last page emptied out
+                self.current_page = pages - 1
+                self._schedule_redraw("rows", "status")
+                return
+            first, last = self._visible_range()
+        self._changed_rows.update(range(max(start, first), min(end, last + 1)))
+        if old_row is None or new_row is None:
+            self._schedule_redraw("changed", "status")
+        else:
+            self._schedule_redraw("changed")
+
+    def _paint_changed_rows(self, rows):
+        """Repaints the given display rows, hiding any that no longer exist."""
+        first, last = self._visible_range()
+        origin = 0 if self.virtual_scroll else first
+        for row in sorted(rows):
+            if first <= row < last:
+                slot_idx = self._slot_for_row(row, first)
+                y = self.header_height + (row - origin) * self.row_height
+                self._paint_row(slot_idx, row, self.data.row(self.filtered[row]), y)
+            else:
+                slot_idx = self._slot_of_row.get(row)
+                if slot_idx is not None:
+                    self._hide_slot(slot_idx)
+
+    def _sort_key_of(self, col_idx):
+        if hasattr(self, 'data_keys') and col_idx < len(self.data_keys):
+            return self.data_keys[col_idx]
+        return None
+
+    def _sort_keys(self, spec=None):
+        if spec is None:
+            spec = self.sort_spec
+        return tuple((self._sort_key_of(col_idx), desc) for col_idx, desc in spec)
+
+    def _sortable(self, col_idx):
+        key = self._sort_key_of(col_idx)
+        if key is None:
+            return False
+        # A provider only holds one page, so only sorts the server can run
+        # are offered; a local sort would order that page alone
+        return (self.data_provider is None
+                or key in getattr(self.data_provider, "columns", {key: None}))
+
+    def _toggle_sort(self, col_idx, additive=False):
+        """
+        Header click: sorts by the column, flips its direction, or (on a
+        descending single-column sort) clears it. With additive (Shift), the
+        column is added to or flipped within a multi-column sort. In provider
+        mode the server orders by one column, so Shift is ignored.
+        """
+        if not self._sortable(col_idx):
+            return
+        if self.data_provider is not None:
+            additive = False
+        tracing.tracer.start("sort", table=self.title, column=self.headers[col_idx])
+        spec = list(self.sort_spec)
+        current = dict(spec)
+        if additive:
+            if col_idx in current:
+                spec = [(c, (not d) if c == col_idx else d) for c, d in spec]
+            else:
+                spec.append((col_idx, False))
+        elif len(spec) == 1 and col_idx in current:
+            spec = [] if current[col_idx] else [(col_idx, True)]
+        else:
+            spec = [(col_idx, False)]
+
+        if self.data_provider is not None:
+            self.sort_spec = spec
+            self._schedule_redraw("header")
+            self._provider_reset(self._current_query())
+            return
+        # Before the first load (or after a failed one) there may be no index yet
+        self._ensure_indexes()
+        if spec:
+            with tracing.tracer.span("sort", rows=len(self.filtered)):
+                filtered = self.sort_index.order(self.filtered, self._sort_keys(spec))
+        else:
+            # Back to dataset order
+            filtered = array("l", sorted(self.filtered))
+        # Only now: a sort that failed must not apply to the next load
+        self.sort_spec = spec
+        self._schedule_redraw("header")
+        self._set_filtered(self._last_query, filtered, presorted=True)
 
     def _search_data(self, *args):
-        self._apply_search()
+        # A burst of typing is one trace, from the first keystroke to the
+        # frame that shows the last search
+        trace = tracing.tracer.current()
+        if trace.name != "search":
+            trace = tracing.tracer.start("search", table=self.title)
+        trace.mark("keystroke")
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_trace.release()
+        trace.hold()
+        self._search_trace = trace
+        self._search_after_id = self.after(self.search_delay_ms, self._run_debounced_search)
+
+    def _run_debounced_search(self):
+        self._search_after_id = None
+        trace, self._search_trace = self._search_trace, tracing.NULL_TRACE
+        with tracing.tracer.bind(trace):
+            self._apply_search(refine=True)
+        self._release_trace(trace)
 
-    def _truncate_text(self, text, max_width):
+    def _truncate_text(self, text, max_width, font=("Segoe UI", 10)):
         if not text: return ""
-        est = len(str(text)) * 7.5
-        if est <= max_width - 30: return str(text)
-        max_chars = int((max_width - 30) / 7.5)
-        if len(str(text)) > max_chars:
-            return str(text)[:max_chars-3] + "..."
-        return str(text)
+        return self._truncator.truncate(str(text), font, max_width - 30)
 
-    def _redraw_table(self):
-        self.canvas.delete("all")
-        self.hover_row = -1
-        self.hover_button = -1
+    def _itemconfig(self, item, **opts):
+        """Configures a canvas item, skipping options that are already set."""
+        cached = self._item_opts.setdefault(item, {})
+        changed = {}
+        for k, v in opts.items():
+            if cached.get(k) != v:
+                changed[k] = v
+        if changed:
+            cached.update(changed)
+            self.canvas.itemconfig(item, **changed)
+
+    def _coords(self, item, *coords):
+        """Moves a canvas item, skipping the call if it is already in place."""
+        if self._item_coords.get(item) != coords:
+            self._item_coords[item] = coords
+            self.canvas.coords(item, *coords)
+
+    def _ensure_header_items(self):
+        if len(self._header_items) == len(self.headers):
+            return
+        for items in self._header_items:
+            for item in items:
+                if item is not None:
+                    self.canvas.delete(item)
+        self._header_items = []
+        for i in range(len(self.headers)):
+            tags = ("header", "head%d" % i)
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, fill="#e5e7eb",
+                                                outline="#d1d5db", tags=tags)
+            text = self.canvas.create_text(0, 0, text="", fill="#374151",
+                                           font=("Segoe UI", 10, "bold"),
+                                           anchor="center", tags=tags)
+            sep = None
+            if i < len(self.headers) - 1:
+                sep = self.canvas.create_line(0, 0, 0, 0, fill="#9ca3af", width=4,
+                                              tags=("separator", "sep%d" % i))
+            self._header_items.append((rect, text, sep))
+
+    def _get_slot(self, slot_idx):
+        """Returns the row slot at slot_idx, creating its canvas items on first use."""
+        while len(self._row_slots) <= slot_idx:
+            idx = len(self._row_slots)
+            slot = _RowSlot()
+            tag = "slot%d" % idx
+            for col_idx in range(len(self.headers) - 1):
+                rect = self.canvas.create_rectangle(0, 0, 0, 0, fill="#ffffff",
+                                                    outline="#e2e8f0", width=1,
+                                                    tags=(tag, "cell"))
+                text = self.canvas.create_text(0, 0, text="", tags=(tag,))
+                slot.cells.append((rect, text))
+            slot.action_rect = self.canvas.create_rectangle(0, 0, 0, 0, fill="#f9fafb",
+                                                            outline="#e2e8f0", width=1,
+                                                            tags=(tag,))
+            self._row_slots.append(slot)
+            self._raise_header = True
+        return self._row_slots[slot_idx]
+
+    def _ensure_slot_buttons(self, slot_idx, count):
+        slot = self._row_slots[slot_idx]
+        while len(slot.buttons) < count:
+            tags = ("slot%d" % slot_idx, "slotbtn%d-%d" % (slot_idx, len(slot.buttons)))
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, tags=tags)
+            text = self.canvas.create_text(0, 0, text="", font=("Segoe UI", 9, "bold"),
+                                           anchor="center", tags=tags)
+            slot.buttons.append((rect, text))
+            self._raise_header = True
+
+    def _bind_slot(self, slot_idx, row, btn_count):
+        """Re-tags a slot's items with the row%d / action-btn-%d-%d tags of its new row."""
+        slot = self._row_slots[slot_idx]
+        if slot.row == row and slot.btn_count == btn_count:
+            return
+        tag = "slot%d" % slot_idx
+        if slot.row != -1:
+            if self._slot_of_row.get(slot.row) == slot_idx:
+                del self._slot_of_row[slot.row]
+            self.canvas.dtag(tag, "row%d" % slot.row)
+            for b in range(slot.btn_count):
+                self.canvas.dtag("slotbtn%d-%d" % (slot_idx, b),
+                                 "action-btn-%d-%d" % (slot.row, b))
+        if row != -1:
+            self._slot_of_row[row] = slot_idx
+            self.canvas.addtag_withtag("row%d" % row, tag)
+            for b in range(btn_count):
+                self.canvas.addtag_withtag("action-btn-%d-%d" % (row, b),
+                                           "slotbtn%d-%d" % (slot_idx, b))
+        slot.row = row
+        slot.btn_count = btn_count
+
+    def _hide_slot(self, slot_idx):
+        slot = self._row_slots[slot_idx]
+        if slot.row == -1:
+            return
+        self._bind_slot(slot_idx, -1, 0)
+        for item in slot.items():
+            self._itemconfig(item, state="hidden")
+
+    def _cell_value(self, col_idx, d):
+        """Returns the (possibly formatted) value of a cell, memoized per row version."""
+        raw_val = ""
+        if hasattr(self, 'data_keys') and col_idx < len(self.data_keys):
+            raw_val = d.get(self.data_keys[col_idx], "")
+        formatter = self.cell_formatters.get(col_idx)
+        if formatter is None:
+            return raw_val
+
+        cache_key = (d.index, col_idx)
+        version = self.data.versions[d.index]
+        entry = self._format_cache.get(cache_key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        start = time.perf_counter()
+        display_val = formatter(raw_val, d)
+        self._format_time += time.perf_counter() - start
+        self._format_calls += 1
+        self._format_cache.put(cache_key, (version, display_val))
+        return display_val
+
+    def _action_buttons(self, d):
+        """Returns the row's button descriptors, computed once per row version."""
+        if not self.get_action_buttons_func:
+            return ()
+        version = self.data.versions[d.index]
+        entry = self._button_cache.get(d.index)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        buttons = tuple(self.get_action_buttons_func(d))
+        self._button_cache.put(d.index, (version, buttons))
+        return buttons
+
+    def _button_layout(self, btn_count, w):
+        """Button (x1, x2) offsets within an action column of width w."""
+        key = (btn_count, w)
+        layout = self._button_layouts.get(key)
+        if layout is None:
+            # Standard width for buttons now
+            btn_width = 85 if btn_count > 1 else 100
+            total_btn_width = (btn_width * btn_count) + (10 * (btn_count - 1))
+            btn_x = (w - total_btn_width) // 2
+            layout = []
+            for _ in range(btn_count):
+                layout.append((btn_x, btn_x + btn_width))
+                btn_x += btn_width + 10
+            self._button_layouts.put(key, layout)
+        return layout
+
+    def _row_bg(self, global_idx):
+        if global_idx == self.hover_row:
+            return "#e0f2fe"
+        return "#ffffff" if global_idx % 2 == 0 else "#f8fafc"
+
+    def _button_outline(self, global_idx, btn_idx):
+        if global_idx == self.hover_row and btn_idx == self.hover_button:
+            return "#1d4ed8", 2
+        return "#d1d5db", 1
 
-        header_height = 38
-        row_start = self.current_page * self.page_size
-        page_data = self.filtered[row_start : row_start + self.page_size]
+    def _restyle_row(self, row):
+        """Re-applies hover-dependent styling to the slot showing row, if any."""
+        slot_idx = self._slot_of_row.get(row)
+        if slot_idx is None:
+            return
+        slot = self._row_slots[slot_idx]
+        row_bg = self._row_bg(row)
+        for rect, text in slot.cells:
+            self._itemconfig(rect, fill=row_bg)
+        for btn_idx in range(slot.btn_count):
+            outline, outline_w = self._button_outline(row, btn_idx)
+            self._itemconfig(slot.buttons[btn_idx][0], outline=outline, width=outline_w)
 
-        # Draw Headers
+    def _set_hover(self, row, btn):
+        """Moves the hover highlight, restyling only the old and new rows."""
+        old_row = self.hover_row
+        if row == old_row and btn == self.hover_button:
+            return
+        self.hover_row = row
+        self.hover_button = btn
+        if old_row != -1:
+            self._dirty_rows.add(old_row)
+        if row != -1:
+            self._dirty_rows.add(row)
+        self._schedule_redraw("hover")
+
+    def _paint_row(self, slot_idx, global_idx, d, y):
+        slot = self._get_slot(slot_idx)
+        buttons = self._action_buttons(d)
+        self._ensure_slot_buttons(slot_idx, len(buttons))
+        self._bind_slot(slot_idx, global_idx, len(buttons))
+
+        row_bg = self._row_bg(global_idx)
         x = 0
-        for i, head in enumerate(self.headers):
-            w = self.col_widths[i]
-            is_action = (i == len(self.headers) - 1)
-            
-            # Header background
-            self.canvas.create_rectangle(x, 0, x + w, header_height,
-                                        fill="#e5e7eb", outline="#d1d5db",
-                                        tags=("header", "head%d" % i))
-            
-            # Text
-            text_x = x + w//2
-            self.canvas.create_text(text_x, header_height//2,
-                                   text=head, fill="#374151",
-                                   font=("Segoe UI", 10, "bold"), anchor="center",
-                                   tags=("header", "head%d" % i))
+        for col_idx, (rect, text) in enumerate(slot.cells):
+            w = self.col_widths[col_idx]
+            self._coords(rect, x, y, x + w, y + self.row_height)
+            self._itemconfig(rect, fill=row_bg, state="normal")
 
-            if i < len(self.headers) - 1:
-                sep_x = x + w - 1
-                # Separator Line
-                self.canvas.create_line(sep_x, 4, sep_x, header_height-4,
-                                       fill="#9ca3af", width=4,
-                                       tags=("separator", "sep%d" % i))
+            display_val = self._cell_value(col_idx, d)
+
+            padx = 12
+            # Defaults
+            anchor = "w"
+            text_x = x + padx
+            fg = "#1f2937"
+            font = ("Segoe UI", 10)
+
+            # Formatters may return (text, fg, font, anchor)
+            if isinstance(display_val, tuple):
+                val_text, fg, font, anchor = display_val
+                if anchor == "center": text_x = x + w//2
+            else:
+                val_text = display_val
+
+            self._coords(text, text_x, y + self.row_height//2)
+            self._itemconfig(text, text=self._truncate_text(val_text, w, font),
+                             fill=fg, font=font, anchor=anchor, state="normal")
             x += w
 
-        # Draw Rows
-        y = header_height
-        for local_idx, d in enumerate(page_data):
-            global_idx = row_start + local_idx
-            is_even = local_idx % 2 == 0
-            row_bg = "#ffffff" if is_even else "#f8fafc"
-            if global_idx == self.hover_row:
-                row_bg = "#e0f2fe"
+        # Action Column
+        w = self.col_widths[-1]
+        self._coords(slot.action_rect, x, y, x + w, y + self.row_height)
+        self._itemconfig(slot.action_rect, state="normal")
 
-            x = 0
-            # Rows are rendered based on data keys provided or inferred
-            # For simplicity, we assume we have a way to map headers to data or vice versa
-            # Better approach: pass a list of keys corresponding to headers (excluding Action)
-            # For now, we'll use keys from data if not specified, but this is risky.
-            # Let's assume the user passes a list of data_keys.
-            
-            # For this component, let's assume 'data_keys' is also an init param.
-            # I'll add that to the class.
-            
-            x = 0
-            for col_idx in range(len(self.headers) - 1): # All except Action
-                w = self.col_widths[col_idx]
-                self.canvas.create_rectangle(x, y, x + w, y + self.row_height,
-                                            fill=row_bg, outline="#e2e8f0", width=1,
-                                            tags=("row%d" % global_idx, "cell"))
-                
-                # Get value - use formatter if exists
-                raw_val = ""
-                if hasattr(self, 'data_keys') and col_idx < len(self.data_keys):
-                    key = self.data_keys[col_idx]
-                    raw_val = d.get(key, "")
-                
-                # Apply custom formatting if any
-                if col_idx in self.cell_formatters:
-                    display_val = self.cell_formatters[col_idx](raw_val, d)
-                else:
-                    display_val = raw_val
-
-                padx = 12
-                # Defaults
-                anchor = "w"
-                text_x = x + padx
-                fg = "#1f2937"
-                font = ("Segoe UI", 10)
-                
-                # Specific styling if provided by formatter? or just hardcoded for now?
-                # Let's allow formatters to return (text, fg, font, anchor)
-                if isinstance(display_val, tuple):
-                    val_text, fg, font, anchor = display_val
-                    if anchor == "center": text_x = x + w//2
-                else:
-                    val_text = display_val
+        btn_y = y + 8
+        slot.actions = buttons
+        slot.button_spans = [(x + x1, x + x2) for x1, x2 in self._button_layout(len(buttons), w)]
+        slot.button_top = btn_y
+        slot.button_bottom = btn_y + self.row_height - 16
+        for btn_idx, (rect, text) in enumerate(slot.buttons):
+            if btn_idx >= len(buttons):
+                self._itemconfig(rect, state="hidden")
+                self._itemconfig(text, state="hidden")
+                continue
+            label, bg, fg_color, cb = buttons[btn_idx]
+            x1, x2 = slot.button_spans[btn_idx]
+            outline, outline_w = self._button_outline(global_idx, btn_idx)
+            self._coords(rect, x1, btn_y, x2, slot.button_bottom)
+            self._itemconfig(rect, fill=bg, outline=outline, width=outline_w, state="normal")
+            self._coords(text, (x1 + x2)//2, btn_y + (self.row_height-16)//2)
+            self._itemconfig(text, text=label, fill=fg_color, state="normal")
 
-                self.canvas.create_text(text_x, y + self.row_height//2,
-                                       text=self._truncate_text(val_text, w), 
-                                       fill=fg, font=font,
-                                       anchor=anchor, tags=("row%d" % global_idx,))
-                x += w
+    def _visible_range(self):
+        """Returns the [first, last) slice of self.filtered that needs canvas items."""
+        total = len(self.filtered)
+        if self.data_provider is not None:
+            # self.filtered is the current page already
+            return 0, total
+        if not self.virtual_scroll:
+            row_start = self.current_page * self.page_size
+            return row_start, min(row_start + self.page_size, total)
+        top = self.canvas.canvasy(0)
+        view_h = self.canvas.winfo_height()
+        first = int(top // self.row_height) - self.overscan
+        last = int((top + view_h) // self.row_height) + 1 + self.overscan
+        return max(0, first), min(total, last)
 
-            # Action Column
-            w = self.col_widths[-1]
-            self.canvas.create_rectangle(x, y, x + w, y + self.row_height,
-                                        fill="#f9fafb", outline="#e2e8f0", width=1,
-                                        tags=("row%d" % global_idx,))
-            
-            if self.get_action_buttons_func:
-                buttons = self.get_action_buttons_func(d)
-                btn_count = len(buttons)
-                # Standard width for buttons now
-                btn_width = 85 if btn_count > 1 else 100
-                total_btn_width = (btn_width * btn_count) + (10 * (btn_count - 1))
-                start_x = x + (w - total_btn_width) // 2
-                
-                btn_x = start_x
-                btn_y = y + 8
-                for btn_idx, (text, bg, fg_color, cb) in enumerate(buttons):
-                    hovered = (global_idx == self.hover_row and btn_idx == self.hover_button)
-                    tags = ("action-btn-%d-%d" % (global_idx, btn_idx), "row%d" % global_idx)
-                    self.canvas.create_rectangle(btn_x, btn_y, btn_x + btn_width, btn_y + self.row_height - 16,
-                                                fill=bg, outline="#1d4ed8" if hovered else "#d1d5db",
-                                                width=2 if hovered else 1, tags=tags)
-                    self.canvas.create_text(btn_x + btn_width//2, btn_y + (self.row_height-16)//2,
-                                           text=text, fill=fg_color,
-                                           font=("Segoe UI", 9, "bold"), anchor="center", tags=tags)
-                    btn_x += btn_width + 10
-            
-            y += self.row_height
+    def _slot_for_row(self, row, first):
+        if not self.virtual_scroll:
+            return row - first
+        # Ring buffer: scrolling by a row rebinds a single slot, the rest keep
+        # their items and text and are only moved.
+        n_slots = self.canvas.winfo_height() // self.row_height + 2 + 2 * self.overscan
+        return row % max(1, n_slots)
+
+    def _schedule_redraw(self, *regions):
+        """Marks regions dirty and makes sure a flush is pending for the next frame."""
+        self._dirty.update(regions)
+        if self._redraw_id is not None:
+            return
+        elapsed = (time.perf_counter() - self._last_paint) * 1000
+        if elapsed >= self.frame_budget_ms:
+            self._redraw_id = self.after_idle(self._flush_redraw)
+        else:
+            self._redraw_id = self.after(max(1, int(self.frame_budget_ms - elapsed)),
+                                         self._flush_redraw)
+
+    def _flush_redraw(self):
+        if self._redraw_id is not None:
+            self.after_cancel(self._redraw_id)
+            self._redraw_id = None
+        dirty, self._dirty = self._dirty, set()
+        rows, self._dirty_rows = self._dirty_rows, set()
+        changed, self._changed_rows = self._changed_rows, set()
+        trace = tracing.tracer.current()
+        self._format_time, self._format_calls = 0.0, 0
 
-        total_height = header_height + len(page_data) * self.row_height
+        with trace.span("render", regions=sorted(dirty)) as span:
+            if "header" in dirty:
+                self._paint_header()
+            if "rows" in dirty:
+                self._paint_rows()
+            else:
+                if changed:
+                    self._paint_changed_rows(changed)
+                for row in rows:
+                    self._restyle_row(row)
+            if "header" in dirty or "rows" in dirty or "changed" in dirty:
+                self._update_scrollregion()
+            if "status" in dirty:
+                self._paint_status()
+            # Row items created by any of the above must stay below the
+            # header, which floats over them in virtual mode
+            if self._raise_header:
+                self.canvas.tag_raise("header")
+                self.canvas.tag_raise("separator")
+                self._raise_header = False
+            if trace and self._format_calls:
+                span.attrs["format_ms"] = round(self._format_time * 1000, 3)
+                span.attrs["formatted"] = self._format_calls
+        self._last_paint = time.perf_counter()
+        trace.frame_painted()
+
+    def _redraw_table(self):
+        """Repaints the whole table synchronously, dropping any pending flush."""
+        self._dirty.update(("header", "rows", "status"))
+        self._flush_redraw()
+
+    def _sort_marker(self, col_idx):
+        for pos, (c, desc) in enumerate(self.sort_spec):
+            if c == col_idx:
+                marker = " ▼" if desc else " ▲"
+                if len(self.sort_spec) > 1:
+                    marker += str(pos + 1)
+                return marker
+        return ""
+
+    def _paint_header(self):
+        header_height = self.header_height
+        # The header follows the view in virtual mode, rows scroll beneath it
+        header_top = self.canvas.canvasy(0) if self.virtual_scroll else 0
+
+        # Headers: the items persist, only their geometry follows the column widths
+        self._ensure_header_items()
+        x = 0
+        for i, (rect, text, sep) in enumerate(self._header_items):
+            w = self.col_widths[i]
+            self._coords(rect, x, header_top, x + w, header_top + header_height)
+            self._coords(text, x + w//2, header_top + header_height//2)
+            self._itemconfig(text, text=self.headers[i] + self._sort_marker(i))
+            if sep is not None:
+                sep_x = x + w - 1
+                self._coords(sep, sep_x, header_top + 4, sep_x, header_top + header_height-4)
+            x += w
+
+    def _paint_rows(self):
+        first, last = self._visible_range()
+        # Rows sit at absolute positions in virtual mode so the canvas does the
+        # scrolling; in page mode they start right below the header.
+        origin = 0 if self.virtual_scroll else first
+
+        # Reuse one slot per visible row, hide the ones left over
+        painted = set()
+        for row in range(first, last):
+            slot_idx = self._slot_for_row(row, first)
+            y = self.header_height + (row - origin) * self.row_height
+            self._paint_row(slot_idx, row, self.data.row(self.filtered[row]), y)
+            painted.add(slot_idx)
+        for slot_idx in range(len(self._row_slots)):
+            if slot_idx not in painted:
+                self._hide_slot(slot_idx)
+
+    def _update_scrollregion(self):
+        total = len(self.filtered)
+        if self.virtual_scroll:
+            total_height = self.header_height + total * self.row_height
+        else:
+            first, last = self._visible_range()
+            total_height = self.header_height + (last - first) * self.row_height
         # Ensure scrollregion is at least the size of the canvas to avoid jumping
         canvas_h = self.canvas.winfo_height()
         scroll_h = max(total_height, canvas_h)
-        self.canvas.config(scrollregion=(0, 0, sum(self.col_widths), scroll_h))
+        scrollregion = (0, 0, sum(self.col_widths), scroll_h)
+        if scrollregion != self._scrollregion:
+            # Reconfiguring fires yscrollcommand, so only do it on real changes
+            self._scrollregion = scrollregion
+            self.canvas.config(scrollregion=scrollregion)
 
+    def _paint_status(self):
         total = len(self.filtered)
+        if self.virtual_scroll:
+            top = self.canvas.canvasy(0)
+            view_h = self.canvas.winfo_height() - self.header_height
+            shown_first = min(total, int(top // self.row_height))
+            shown_last = min(total, int((top + view_h) // self.row_height))
+            start = shown_first + 1 if total > 0 else 0
+            self.records_label.config(text="Showing %d–%d of %d records" % (start, shown_last, total))
+            return
+
+        first, last = self._visible_range()
+        if self.data_provider is not None:
+            # Report positions within the whole server-side result
+            offset = self.current_page * self.page_size
+            total = max(self._provider_total, offset + last)
+            first, last = first + offset, last + offset
         total_pages = max(1, (total + self.page_size - 1) // self.page_size)
         curr = self.current_page + 1
-        start = row_start + 1 if total > 0 else 0
-        end = min(row_start + self.page_size, total)
+        start = first + 1 if total > 0 else 0
         self.page_label.config(text="Page %d of %d" % (curr, total_pages))
-        self.records_label.config(text="Showing %d–%d of %d records" % (start, end, total))
+        self.records_label.config(text="Showing %d–%d of %d records" % (start, last, total))
 
     def _on_canvas_motion(self, event):
         cx = self.canvas.canvasx(event.x)
@@ -399,32 +2029,13 @@ class CanvasDataTable(ttk.Frame):
         
         # Check if we are over a column boundary for resizing
         over_separator = False
-        if cy < 38: # Only headers
+        if self._in_header(cy): # Only headers
             sep_idx = self._get_column_boundary(cx)
             if sep_idx != -1:
                 over_separator = True
 
-        items = self.canvas.find_overlapping(cx-10, cy-10, cx+10, cy+10)
-
-        new_row = -1
-        new_btn = -1
-
-        for item in items:
-            tags = self.canvas.gettags(item)
-            for tag in tags:
-                if tag.startswith("row"):
-                    new_row = int(tag[3:])
-                if tag.startswith("action-btn-"):
-                    parts = tag.split("-")
-                    new_row = int(parts[2])
-                    new_btn = int(parts[3])
-
-        redraw_needed = (new_row != self.hover_row or new_btn != self.hover_button)
-        self.hover_row = new_row
-        self.hover_button = new_btn
-
-        if redraw_needed:
-            self._redraw_table()
+        new_row, new_btn = self._hit_test(cx, cy)
+        self._set_hover(new_row, new_btn)
 
         if new_btn != -1:
             self.canvas.config(cursor="hand2")
@@ -433,84 +2044,103 @@ class CanvasDataTable(ttk.Frame):
         else:
             self.canvas.config(cursor="")
 
+    def _in_header(self, cy):
+        header_top = self.canvas.canvasy(0) if self.virtual_scroll else 0
+        return cy < header_top + self.header_height
+
+    def _row_at(self, cy):
+        """Maps a canvas y coordinate below the header to an index into filtered."""
+        origin = 0 if self.virtual_scroll else self._visible_range()[0]
+        return int((cy - self.header_height) // self.row_height) + origin
+
+    def _column_edges(self):
+        key = tuple(self.col_widths)
+        if key != self._col_edges_key:
+            edges = []
+            x = 0
+            for w in self.col_widths:
+                x += w
+                edges.append(x)
+            self._col_edges = edges
+            self._col_edges_key = key
+        return self._col_edges
+
+    def _col_at(self, cx):
+        edges = self._column_edges()
+        if cx < 0:
+            return -1
+        col_idx = bisect.bisect_right(edges, cx)
+        return col_idx if col_idx < len(edges) else -1
+
     def _get_column_boundary(self, cx):
-        x = 0
         threshold = 12
-        for i in range(len(self.col_widths) - 1): # All except after the last one
-            x += self.col_widths[i]
-            if x - threshold <= cx <= x + threshold:
-                return i
+        edges = self._column_edges()[:-1] # All except after the last one
+        i = bisect.bisect_left(edges, cx - threshold)
+        if i < len(edges) and edges[i] <= cx + threshold:
+            return i
         return -1
 
+    def _hit_test(self, cx, cy):
+        """Returns (row, button) under a canvas point, -1 where there is none."""
+        if self._in_header(cy):
+            return -1, -1
+        row = self._row_at(cy)
+        first, last = self._visible_range()
+        slot_idx = self._slot_of_row.get(row)
+        if not (first <= row < last) or slot_idx is None:
+            return -1, -1
+        slot = self._row_slots[slot_idx]
+        if slot.button_top <= cy <= slot.button_bottom:
+            for btn_idx, (x1, x2) in enumerate(slot.button_spans):
+                if x1 <= cx <= x2:
+                    return row, btn_idx
+        return row, -1
+
     def _on_canvas_leave(self, event):
         if self.dragging_col == -1:
-            self.hover_row = -1
-            self.hover_button = -1
+            self._set_hover(-1, -1)
             self.canvas.config(cursor="")
-            self._redraw_table()
 
     def _on_canvas_click(self, event):
         cx = self.canvas.canvasx(event.x)
         cy = self.canvas.canvasy(event.y)
-        items = self.canvas.find_overlapping(cx-10, cy-10, cx+10, cy+10)
-        tags = []
-        for item in items:
-            tags.extend(self.canvas.gettags(item))
 
         # Header Area Interaction
-        if cy < 38:
+        if self._in_header(cy):
             boundary_col = self._get_column_boundary(cx)
             if boundary_col != -1:
                 self.dragging_col = boundary_col
                 self.canvas.config(cursor="sb_h_double_arrow")
                 return
-            
-            # Header Area Click (No Sorting)
-            if any(t == "header" for t in tags):
-                return
+            # Header Area Click: sort, Shift+Click for multi-column sort
+            col_idx = self._col_at(cx)
+            if 0 <= col_idx < len(self.headers) - 1:
+                self._toggle_sort(col_idx, additive=bool(event.state & 0x0001))
+            return
 
-        for item in items:
-            tags = self.canvas.gettags(item)
-            for tag in tags:
-                if tag.startswith("action-btn-"):
-                    parts = tag.split("-")
-                    row_idx = int(parts[2])
-                    btn_idx = int(parts[3])
-                    if row_idx >= len(self.filtered): return
-                    record = self.filtered[row_idx]
-                    buttons = self.get_action_buttons_func(record)
-                    if btn_idx < len(buttons) and buttons[btn_idx][3]:
-                        buttons[btn_idx][3](record)
-                    return
+        row_idx, btn_idx = self._hit_test(cx, cy)
+        if row_idx == -1: return
+        record = self.data.row(self.filtered[row_idx])
+
+        if btn_idx != -1:
+            buttons = self._row_slots[self._slot_of_row[row_idx]].actions
+            if btn_idx < len(buttons) and buttons[btn_idx][3]:
+                buttons[btn_idx][3](record)
+            return
 
         # Cell copy logic
-        if cy >= 38:
-            rel_y = cy - 38
-            row_idx = int(rel_y // self.row_height) + self.current_page * self.page_size
-            if row_idx >= len(self.filtered): return
-            x_pos = 0
-            col_idx = -1
-            for i, w in enumerate(self.col_widths):
-                if cx < x_pos + w:
-                    col_idx = i
-                    break
-                x_pos += w
-            
-            if col_idx < len(self.headers) - 1:
-                record = self.filtered[row_idx]
-                key = self.data_keys[col_idx] if hasattr(self, 'data_keys') and col_idx < len(self.data_keys) else None
-                if key:
-                    val = record.get(key, "")
-                    # Apply formatter if exists for copying formatted value
-                    if col_idx in self.cell_formatters:
-                        fmt_val = self.cell_formatters[col_idx](val, record)
-                        if isinstance(fmt_val, tuple): val = fmt_val[0]
-                        else: val = fmt_val
-                    
-                    if val and val != "—":
-                        self.clipboard_clear()
-                        self.clipboard_append(str(val))
-                        self._show_copy_feedback(event.x, event.y)
+        col_idx = self._col_at(cx)
+        if 0 <= col_idx < len(self.headers) - 1:
+            key = self.data_keys[col_idx] if hasattr(self, 'data_keys') and col_idx < len(self.data_keys) else None
+            if key:
+                # Copy the formatted value if there is a formatter
+                val = self._cell_value(col_idx, record)
+                if isinstance(val, tuple): val = val[0]
+
+                if val and val != "—":
+                    self.clipboard_clear()
+                    self.clipboard_append(str(val))
+                    self._show_copy_feedback(event.x, event.y)
 
     def _on_resize_drag(self, event):
         if self.dragging_col == -1: return
@@ -521,8 +2151,7 @@ class CanvasDataTable(ttk.Frame):
         header_text = self.headers[self.dragging_col]
         # Using a default font measurement as backup
         try:
-            f = tkfont.Font(family="Segoe UI", size=10, weight="bold")
-            text_w = f.measure(header_text)
+            text_w = self._truncator.measure(("Segoe UI", 10, "bold"), header_text)
         except:
             text_w = len(header_text) * 9
             
@@ -530,8 +2159,8 @@ class CanvasDataTable(ttk.Frame):
         
         new_w = max(min_w, cx - prev)
         self.col_widths[self.dragging_col] = new_w
-        self._redraw_table()
         self._stretch_last_column() # Ensure last column reacts to change
+        self._schedule_redraw("header", "rows")
 
     def _on_resize_release(self, event):
         self.dragging_col = -1
@@ -547,13 +2176,26 @@ class CanvasDataTable(ttk.Frame):
         self.copy_feedback_id = self.canvas.after(1500, lambda: self.canvas.delete("copy_feedback"))
 
     def _prev_page(self):
+        if self.virtual_scroll:
+            self.canvas.yview_scroll(-1, "pages")
+            return
         if self.current_page > 0:
-            self.current_page -= 1
-            self.canvas.yview_moveto(0)
-            self._redraw_table()
+            self._turn_page(self.current_page - 1)
 
     def _next_page(self):
-        if (self.current_page + 1) * self.page_size < len(self.filtered):
-            self.current_page += 1
+        if self.virtual_scroll:
+            self.canvas.yview_scroll(1, "pages")
+            return
+        total = self._provider_total if self.data_provider is not None else len(self.filtered)
+        if (self.current_page + 1) * self.page_size < total:
+            self._turn_page(self.current_page + 1)
+
+    def _turn_page(self, page):
+        trace = tracing.tracer.start("page", table=self.title, page=page)
+        if self.data_provider is not None:
+            self._show_provider_page(page)
+        else:
+            self.current_page = page
             self.canvas.yview_moveto(0)
-            self._redraw_table()
+            self._schedule_redraw("rows", "status")
+        self._settle_trace(trace)
@@ -19,6 +19,8 @@ class UsersPage(ttk.Frame):
             headers=["ID", "Username", "Department", "Permissions", "Actions"],
             initial_widths=[60, 180, 180, 280, 180],
             fetch_data_func=self._fetch_users,
+            invalidate_func=self._invalidate_users,
+            fresh_ttl=30,
             get_action_buttons_func=self._get_actions,
             search_placeholder="Search users...",
             search_keys=["id", "admin_name", "department"],
@@ -66,6 +68,10 @@ class UsersPage(ttk.Frame):
             print("Error fetching users: {}".format(e))
             return []
 
+    def _invalidate_users(self):
+        from db_handler import db
+        db.invalidate("drawing_users")
+
     def _get_actions(self, user):
         buttons = []
         buttons.append(("Edit", styles.PRIMARY, "white", self._show_edit_user_dialog))
@@ -142,12 +148,12 @@ class UsersPage(ttk.Frame):
     def _create_user_db(self, username, password, department, perms, dlg):
         try:
             from db_handler import db
-            if db.fetch_all("SELECT id FROM drawing_users WHERE admin_name=%s", (username,)):
+            if db.fetch_all("SELECT id FROM drawing_users WHERE admin_name=%s", (username,), cache=False):
                 messagebox.showerror("Error", "Username exists", parent=dlg); return
             pwd_hash = hashlib.md5(password.encode('utf-8')).hexdigest()
             if db.execute_query("INSERT INTO drawing_users (admin_name, admin_pass, department, access_tokens) VALUES (%s, %s, %s, %s)",
                                (username, pwd_hash, department, json.dumps(perms))):
-                messagebox.showinfo("Success", "User created", parent=dlg); dlg.destroy(); self.refresh()
+                messagebox.showinfo("Success", "User created", parent=dlg); dlg.destroy(); self.refresh(force=True)
             else: messagebox.showerror("Error", "Failed", parent=dlg)
         except Exception as e: messagebox.showerror("Error", str(e), parent=dlg)
 
@@ -162,7 +168,7 @@ class UsersPage(ttk.Frame):
                 q = "UPDATE drawing_users SET admin_name=%s, department=%s, access_tokens=%s WHERE id=%s"
                 p = (username, department, json.dumps(perms), uid)
             if db.execute_query(q, p):
-                messagebox.showinfo("Success", "User updated", parent=dlg); dlg.destroy(); self.refresh()
+                messagebox.showinfo("Success", "User updated", parent=dlg); dlg.destroy(); self.refresh(force=True)
             else: messagebox.showerror("Error", "Failed", parent=dlg)
         except Exception as e: messagebox.showerror("Error", str(e), parent=dlg)
 
@@ -171,9 +177,9 @@ class UsersPage(ttk.Frame):
         try:
             from db_handler import db
             if db.execute_query("DELETE FROM drawing_users WHERE id=%s", (user['id'],)):
-                messagebox.showinfo("Success", "Deleted"); self.refresh()
+                messagebox.showinfo("Success", "Deleted"); self.refresh(force=True)
             else: messagebox.showerror("Error", "Failed")
         except Exception as e: messagebox.showerror("Error", str(e))
 
-    def refresh(self):
-        self.table.refresh()
+    def refresh(self, force=False):
+        self.table.refresh(force)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from decimal import Decimal
+
+from pages.column_store import ColumnStore, MISSING
+from pages.table_component import KeyIndex, SearchIndex, SortIndex
+
+def _records(n):
+    return [{"no": "DRW-%03d" % i, "rev": i % 3,
+             "status": ["Approved", "Requested", "Issued"][i % 3]} for i in range(n)]
+
+class ColumnStoreTest(unittest.TestCase):
+    def test_column_kinds(self):
+        store = ColumnStore.from_records(_records(12))
+        self.assertEqual(store.column("rev").kind, "int")
+        self.assertEqual(store.column("status").kind, "category")
+        self.assertEqual(store.column("no").kind, "object")
+        self.assertEqual(store.row(4).to_dict(), {"no": "DRW-004", "rev": 1, "status": "Requested"})
+
+    def test_missing_keys(self):
+        store = ColumnStore.from_records([{"a": 1}, {"b": 2}])
+        self.assertEqual(store.keys, ["a", "b"])
+        self.assertIs(store.get(0, "b", MISSING), MISSING)
+        self.assertNotIn("b", store.row(0))
+        self.assertEqual(store.row(1).to_dict(), {"b": 2})
+
+    def test_equal_but_distinct_values_are_not_merged(self):
+        values = [True, 1, 1.0, Decimal("1.5"), Decimal("1.50")] * 4
+        store = ColumnStore.from_records([{"v": v} for v in values])
+        self.assertEqual(store.column("v").kind, "object")
+        self.assertEqual([repr(v) for v in store.column_values("v")], [repr(v) for v in values])
+
+        # Writing one into a category column widens it instead of interning it
+        store = ColumnStore.from_records(_records(12))
+        store.set(0, "status", True)
+        store.set(1, "status", 1)
+        self.assertIs(store.get(0, "status"), True)
+        self.assertIs(type(store.get(1, "status")), int)
+        self.assertEqual(store.get(2, "status"), "Issued")
+
+    def test_int_column_widens(self):
+        store = ColumnStore.from_records(_records(6))
+        store.set(0, "rev", "A")
+        store.append({"no": "X", "rev": 2 ** 70})
+        self.assertEqual(store.column_values("rev"), ["A", 1, 2, 0, 1, 2, 2 ** 70])
+
+    def test_versions_change_on_write_and_are_never_reused(self):
+        store = ColumnStore.from_records(_records(4))
+        seen = set(store.versions)
+        before = store.versions[2]
+        store.set(2, "rev", 9)
+        self.assertNotEqual(store.versions[2], before)
+        self.assertNotIn(store.versions[2], seen)
+        seen.update(store.versions)
+
+        store.delete(0)
+        store.append({"no": "new"})
+        store.extend([{"no": "newer"}, {"no": "newest"}])
+        self.assertEqual(len(set(store.versions)), len(store))
+        self.assertFalse(set(store.versions[-3:]) & seen)
+
+    def test_keep(self):
+        store = ColumnStore.from_records(_records(6))
+        versions = list(store.versions)
+        store.keep(bytearray([1, 0, 1, 0, 0, 1]))
+        self.assertEqual(store.column_values("no"), ["DRW-000", "DRW-002", "DRW-005"])
+        self.assertEqual(store.column_values("status"), ["Approved", "Issued", "Issued"])
+        self.assertEqual(list(store.versions), [versions[0], versions[2], versions[5]])
+
+class SearchIndexTest(unittest.TestCase):
+    def test_search_and_updates(self):
+        store = ColumnStore.from_records(_records(9))
+        index = SearchIndex(["no", "status"])
+        index.build(store)
+        self.assertEqual(list(index.search("requested", range(len(store)))), [1, 4, 7])
+        # The separator keeps a query from matching across two fields
+        self.assertEqual(list(index.search("8approved", range(len(store)))), [])
+
+        store.set(4, "status", "Approved")
+        index.update(store, 4)
+        self.assertEqual(list(index.search("requested", range(len(store)))), [1, 7])
+
+        store.delete(1)
+        index.remove(1)
+        store.keep(bytearray([1, 1, 1, 1, 1, 1, 0, 1]))
+        index.keep(bytearray([1, 1, 1, 1, 1, 1, 0, 1]))
+        self.assertEqual(len(index), len(store))
+        self.assertEqual(list(index.search("drw", range(len(store)))), list(range(len(store))))
+        self.assertEqual(list(index.search("requested", range(len(store)))), [])
+
+    def test_cancelled(self):
+        store = ColumnStore.from_records(_records(3))
+        index = SearchIndex()
+        index.build(store)
+        self.assertIsNone(index.search("drw", range(3), cancelled=lambda: True))
+
+class SortIndexTest(unittest.TestCase):
+    def _index(self, records):
+        store = ColumnStore.from_records(records)
+        index = SortIndex()
+        index.reset(store)
+        return store, index
+
+    def test_mixed_values(self):
+        store, index = self._index([{"v": v} for v in ["b", None, 3, "A", "", 1.5]])
+        order = index.order(range(len(store)), (("v", False),))
+        self.assertEqual([store.get(i, "v") for i in order], [1.5, 3, "A", "b", None, ""])
+
+    def test_descending_keeps_ties_in_dataset_order(self):
+        for kind, records in (("category", _records(30)),
+                              ("object", [dict(r, status=r["status"] + r["no"][-1:])
+                                          for r in _records(30)])):
+            store, index = self._index(records)
+            self.assertEqual(store.column("status").kind, kind)
+            order = index.order(range(len(store)), (("status", True),))
+            statuses = [store.get(i, "status") for i in order]
+            self.assertEqual(statuses, sorted(statuses, key=str.lower, reverse=True))
+            for status in set(statuses):
+                tied = [i for i in order if store.get(i, "status") == status]
+                self.assertEqual(tied, sorted(tied))
+
+    def test_multi_column_and_subsets(self):
+        store, index = self._index(_records(30))
+        spec = (("status", False), ("rev", True), ("no", True))
+        full = list(index.order(range(len(store)), spec))
+        expected = sorted(range(len(store)), key=lambda i: (
+            store.get(i, "status"), -store.get(i, "rev"), -i))
+        self.assertEqual(full, expected)
+        # Small and large subsets take different paths but agree
+        for subset in ([5, 1, 29], range(0, 30, 2)):
+            self.assertEqual(list(index.order(subset, spec)), [i for i in full if i in subset])
+
+    def test_extend_ranks_only_new_rows(self):
+        records = [{"v": v, "n": i} for i, v in enumerate(["m", "c", "x", None, 5, "c"])]
+        store, index = self._index(records)
+        spec = (("v", True), ("n", False))
+        index.order(range(len(store)), spec)
+        kept = list(index.ranks("v"))
+        store.extend([{"v": v, "n": 6 + i} for i, v in enumerate(["a", "d", "e", "m", "z", 1, None])])
+        self.assertTrue(index.extend())
+        self.assertEqual(list(index.ranks("v"))[:6], kept)
+
+        fresh = SortIndex()
+        fresh.reset(store)
+        for spec in (spec, (("v", False),), (("v", True),)):
+            self.assertEqual(list(index.order(range(len(store)), spec)),
+                             list(fresh.order(range(len(store)), spec)))
+
+    def test_extend_out_of_gaps(self):
+        store, index = self._index([{"v": "a"}, {"v": "c"}])
+        index.GAP = 1
+        index.ranks("v")
+        store.append({"v": "b"})
+        self.assertFalse(index.extend())
+        self.assertEqual([store.get(i, "v") for i in index.order(range(3), (("v", False),))],
+                         ["a", "b", "c"])
+
+class KeyIndexTest(unittest.TestCase):
+    def test_positions_follow_adds_and_removals(self):
+        keys = ["k%d" % i for i in range(10)]
+        index = KeyIndex(keys)
+        for key in ("k2", "k7", "k0"):
+            index.remove(key)
+            keys.remove(key)
+        for key in ("n1", "n2"):
+            keys.append(key)
+            index.add(key, len(keys) - 1)
+        index.remove("k5")
+        keys.remove("k5")
+        self.assertEqual(len(index), len(keys))
+        self.assertEqual([index.get(k) for k in keys], list(range(len(keys))))
+        self.assertIsNone(index.get("k2"))
+
+    def test_first_row_wins(self):
+        index = KeyIndex(["a", "b", "a"])
+        index.add("b", 3)
+        self.assertEqual((index.get("a"), index.get("b"), len(index)), (0, 1, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+try:
+    import pymysql
+    from db_handler import ConnectionPool, PoolTimeout
+except ImportError:
+    pymysql = None
+
+class FakeConnection(object):
+    def __init__(self, n):
+        self.n = n
+        self.open = True
+        self.pings = 0
+        self.ping_fails = False
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if self.ping_fails:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.open = False
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class ConnectionPoolTest(unittest.TestCase):
+    def _pool(self, **kw):
+        self.made = []
+
+        def connect():
+            conn = FakeConnection(len(self.made))
+            self.made.append(conn)
+            return conn
+        kw.setdefault("wait_timeout", 0.2)
+        return ConnectionPool(connect, **kw)
+
+    def test_reuses_released_connections(self):
+        pool = self._pool(max_size=2)
+        a = pool.acquire()
+        pool.release(a)
+        self.assertIs(pool.acquire(), a)
+        b = pool.acquire()
+        self.assertIsNot(a, b)
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["checkouts"], stats["leased"]), (2, 3, 2))
+
+    def test_timeout_when_exhausted(self):
+        pool = self._pool(max_size=1, wait_timeout=0.05)
+        pool.acquire()
+        start = time.monotonic()
+        self.assertRaises(PoolTimeout, pool.acquire)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self._pool(max_size=1, wait_timeout=2)
+        conn = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (conn,))
+        timer.start()
+        self.assertIs(pool.acquire(), conn)
+        timer.join()
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_broken_release_frees_the_slot(self):
+        pool = self._pool(max_size=1)
+        conn = pool.acquire()
+        pool.release(conn, broken=True)
+        self.assertFalse(conn.open)
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, conn)
+        stats = pool.stats()
+        self.assertEqual((stats["discarded"], stats["size"]), (1, 1))
+
+    def test_closed_connection_is_discarded(self):
+        pool = self._pool(max_size=1)
+        conn = pool.acquire()
+        conn.open = False
+        pool.release(conn)
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+    def test_failed_ping_replaces_connection(self):
+        pool = self._pool(max_size=1, ping_after=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.ping_fails = True
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, conn)
+        self.assertEqual(conn.pings, 1)
+        self.assertFalse(conn.open)
+
+    def test_recently_used_connection_is_not_pinged(self):
+        pool = self._pool(ping_after=60)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(conn.pings, 0)
+
+    def test_idle_connections_expire(self):
+        pool = self._pool(max_idle=0.01)
+        conn = pool.acquire()
+        pool.release(conn)
+        time.sleep(0.02)
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertFalse(conn.open)
+        stats = pool.stats()
+        self.assertEqual((stats["expired"], stats["size"]), (1, 1))
+
+    def test_connect_error_frees_the_slot(self):
+        pool = self._pool(max_size=1)
+        connect = pool._connect
+
+        def failing():
+            raise pymysql.err.OperationalError(2003, "Can't connect")
+        pool._connect = failing
+        self.assertRaises(pymysql.Error, pool.acquire)
+        pool._connect = connect
+        pool.acquire()
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_close_all(self):
+        pool = self._pool()
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        pool.close_all()
+        self.assertFalse(a.open)
+        self.assertTrue(b.open)
+        self.assertEqual(pool.stats()["size"], 1)
+        # Leased connections are closed on release instead of pooled
+        pool.release(b)
+        self.assertFalse(b.open)
+        c = pool.acquire()
+        pool.release(c)
+        self.assertFalse(c.open)
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["idle"]), (0, 0))
+
+    def test_double_and_foreign_release_are_ignored(self):
+        pool = self._pool(max_size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        pool.release(conn)
+        pool.release(FakeConnection(-1))
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["idle"], stats["discarded"]), (1, 1, 0))
+        self.assertIs(pool.acquire(), conn)
+        self.assertIsNot(pool.acquire(), conn)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import unittest
+
+from pages.data_provider import SQLPagedProvider
+
+class SQLiteDB(object):
+    """Just enough of DBHandler over sqlite, which orders NULLs the way MySQL does."""
+    def __init__(self, rows):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("CREATE TABLE drawings (no TEXT PRIMARY KEY, rev INTEGER, status TEXT)")
+        self.conn.executemany("INSERT INTO drawings VALUES (:no, :rev, :status)", rows)
+        self.calls = []
+        self.error = None
+
+    def fetch_all(self, query, params=None, **kw):
+        self.calls.append((query, params, kw))
+        if self.error:
+            raise self.error
+        return [dict(r) for r in self.conn.execute(query.replace("%s", "?"), params or ())]
+
+def _records():
+    revs = [3, None, 1, 3, None, 2, 1, None, 3, 2]
+    return [{"no": "DRW-%03d" % i, "rev": rev, "status": "Approved"}
+            for i, rev in enumerate(revs)]
+
+class KeysetTest(unittest.TestCase):
+    def _provider(self, records=None):
+        self.db = SQLiteDB(records or _records())
+        return SQLPagedProvider(self.db, "drawings",
+                                {"no": "no", "rev": "rev", "status": "status"}, "no")
+
+    def _pages(self, provider, sort, limit=3):
+        shown, after = [], None
+        while True:
+            rows = provider.fetch_page("", after, limit, sort)
+            shown.extend(r["no"] for r in rows)
+            if len(rows) < limit:
+                return shown
+            after = provider.key_of(rows[-1], sort)
+
+    def test_pages_match_a_full_sort(self):
+        provider = self._provider()
+        for sort in (None, ("no", True), ("rev", False), ("rev", True)):
+            if sort and sort[0] == "rev":
+                direction = "DESC" if sort[1] else "ASC"
+                order = "rev %s, no %s" % (direction, direction)
+            else:
+                order = "no DESC" if sort else "no"
+            expected = [r["no"] for r in self.db.conn.execute(
+                "SELECT no FROM drawings ORDER BY " + order)]
+            self.assertEqual(self._pages(provider, sort), expected, sort)
+
+    def test_after_null_and_non_null(self):
+        after = SQLPagedProvider._after
+        self.assertEqual(after("rev", "no", (None, "DRW-004"), False),
+                         ("((rev IS NULL AND no > %s) OR rev IS NOT NULL)", ["DRW-004"]))
+        self.assertEqual(after("rev", "no", (None, "DRW-004"), True),
+                         ("(rev IS NULL AND no < %s)", ["DRW-004"]))
+        self.assertEqual(after("rev", "no", (2, "DRW-005"), False),
+                         ("(rev, no) > (%s, %s)", [2, "DRW-005"]))
+        self.assertEqual(after("rev", "no", (2, "DRW-005"), True),
+                         ("((rev, no) < (%s, %s) OR rev IS NULL)", [2, "DRW-005"]))
+
+    def test_after_against_the_database(self):
+        provider = self._provider()
+        rows = [dict(r) for r in self.db.conn.execute("SELECT * FROM drawings")]
+        for descending in (False, True):
+            direction = "DESC" if descending else "ASC"
+            ordered = [r["no"] for r in self.db.conn.execute(
+                "SELECT no FROM drawings ORDER BY rev %s, no %s" % (direction, direction))]
+            for row in rows:
+                clause, params = provider._after("rev", "no", (row["rev"], row["no"]), descending)
+                following = [r["no"] for r in self.db.conn.execute(
+                    "SELECT no FROM drawings WHERE %s ORDER BY rev %s, no %s"
+                    % (clause.replace("%s", "?"), direction, direction), params)]
+                self.assertEqual(following, ordered[ordered.index(row["no"]) + 1:],
+                                 (row, descending))
+
+class FiltersTest(unittest.TestCase):
+    def _provider(self, **kw):
+        self.db = SQLiteDB([])
+        return SQLPagedProvider(self.db, "drawings", {"no": "drawing_no", "status": "status"},
+                                "no", **kw)
+
+    def test_like_wildcards_are_escaped(self):
+        clauses, params = self._provider()._filters("50%_a\\b")
+        self.assertEqual(clauses, ["(drawing_no LIKE %s OR status LIKE %s)"])
+        self.assertEqual(params, ["%50\\%\\_a\\\\b%"] * 2)
+
+    def test_where_and_search_extra(self):
+        provider = self._provider(where="status <> %s", where_params=["Void"],
+                                  search_keys=["no"],
+                                  search_extra=lambda q: ["DRW-007", "DRW-009"])
+        clauses, params = provider._filters("req")
+        self.assertEqual(clauses, ["(status <> %s)",
+                                   "(drawing_no LIKE %s OR drawing_no IN (%s, %s))"])
+        self.assertEqual(params, ["Void", "%req%", "DRW-007", "DRW-009"])
+        self.assertEqual(provider._filters(""), (["(status <> %s)"], ["Void"]))
+
+    def test_errors_are_raised(self):
+        provider = self._provider()
+        self.db.error = IOError("Lost connection to MySQL server during query")
+        self.assertRaises(IOError, provider.count, "")
+        self.assertRaises(IOError, provider.fetch_page, "", None, 10)
+        self.assertTrue(all(kw.get("strict") for _, _, kw in self.db.calls))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+try:
+    import pymysql
+    from db_handler import ConnectionPool, DBHandler, PoolTimeout, QueryStats
+except ImportError:
+    pymysql = None
+
+class FakeCursor(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.fetched = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def execute(self, query, params=None):
+        if self.conn.fail_on is not None and self.conn.fail_on in (params or ()):
+            raise pymysql.err.IntegrityError(1062, "Duplicate entry")
+        self.conn.log.append(("execute", query, params))
+        return 1
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        if self.conn.fail_on is not None and self.conn.fail_on in seq_params:
+            raise pymysql.err.IntegrityError(1062, "Duplicate entry")
+        self.conn.log.append(("executemany", query, seq_params))
+        return len(seq_params)
+
+    def fetchall(self):
+        return [dict(row) for row in self.conn.rows]
+
+    def fetchmany(self, size):
+        if self.conn.lost_after is not None and self.fetched >= self.conn.lost_after:
+            raise pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+        rows = self.conn.rows[self.fetched:self.fetched + size]
+        self.fetched += len(rows)
+        return rows
+
+    def close(self):
+        pass
+
+class FakeConnection(object):
+    def __init__(self, rows=(), lost_after=None, fail_on=None):
+        self.rows = list(rows)
+        self.lost_after = lost_after
+        self.fail_on = fail_on
+        self.open = True
+        self.log = []
+
+    def cursor(self, cursorclass=None):
+        return FakeCursor(self)
+
+    def begin(self):
+        self.log.append("begin")
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def ping(self, reconnect=True):
+        pass
+
+    def close(self):
+        self.open = False
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class DBHandlerTestCase(unittest.TestCase):
+    def _db(self, **kw):
+        self.conn = FakeConnection(**kw)
+        db = DBHandler()
+        db.pool = ConnectionPool(lambda: self.conn, max_size=1, wait_timeout=0.1)
+        db.metrics = QueryStats(slow_log=None)
+        return db
+
+class FetchIterTest(DBHandlerTestCase):
+    ROWS = [{"drawing_no": "DRW-%03d" % i} for i in range(10)]
+
+    def test_batches(self):
+        db = self._db(rows=self.ROWS)
+        batches = list(db.fetch_iter("SELECT drawing_no FROM drawings", batch_size=4))
+        self.assertEqual([len(b) for b in batches], [4, 4, 2])
+        self.assertEqual(db.pool_stats()["idle"], 1)
+
+    def test_error_mid_stream_is_raised(self):
+        db = self._db(rows=self.ROWS, lost_after=3)
+        batches = []
+        with self.assertRaises(pymysql.err.OperationalError):
+            for batch in db.fetch_iter("SELECT drawing_no FROM drawings", batch_size=3):
+                batches.append(batch)
+        self.assertEqual(len(batches), 1)
+        # The broken connection is not pooled again
+        self.assertFalse(self.conn.open)
+        stats = db.pool_stats()
+        self.assertEqual((stats["size"], stats["discarded"]), (0, 1))
+        self.assertEqual([s["errors"] for s in db.query_stats().values()], [1])
+
+    def test_no_connection_is_raised(self):
+        db = self._db()
+        db.pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            next(db.fetch_iter("SELECT drawing_no FROM drawings"))
+
+class ExecuteQueryTest(DBHandlerTestCase):
+    def test_scalar_params(self):
+        db = self._db()
+        self.assertTrue(db.execute_query("DELETE FROM drawings WHERE id = %s", 7))
+        self.assertTrue(db.execute_query("DELETE FROM drawings WHERE no = %s", "DRW-001"))
+        self.assertEqual([s["bytes"] for s in db.query_stats().values()], [8, 7])
+        self.assertEqual(self.conn.log.count("commit"), 2)
+
+    def test_malformed_slow_query_ms(self):
+        with mock.patch.dict("os.environ", {"DMS_SLOW_QUERY_MS": "fast"}):
+            self.assertEqual(DBHandler().metrics.slow_ms, 500)
+        with mock.patch.dict("os.environ", {"DMS_SLOW_QUERY_MS": " 250 "}):
+            self.assertEqual(DBHandler().metrics.slow_ms, 250)
+
+class ExecuteManyTest(DBHandlerTestCase):
+    QUERY = "INSERT INTO drawing_users (admin_name) VALUES (%s)"
+
+    def _batches(self):
+        return [len(e[2]) for e in self.conn.log if isinstance(e, tuple) and e[0] == "executemany"]
+
+    def test_batches_at_the_size_threshold(self):
+        for n, expected in ((7, [3, 3, 1]), (6, [3, 3]), (0, [])):
+            db = self._db()
+            reports = []
+            self.assertTrue(db.execute_many(self.QUERY, (("u%d" % i,) for i in range(n)),
+                                            batch_size=3, on_batch=reports.append))
+            self.assertEqual(self._batches(), expected)
+            self.assertEqual([(r["batch"], r["rows"]) for r in reports],
+                             list(enumerate(expected, 1)))
+            self.assertEqual(self.conn.log[0], "begin")
+            self.assertEqual(self.conn.log[-1], "commit")
+            self.assertEqual(db.pool_stats()["idle"], 1)
+
+    def test_failed_batch_rolls_back(self):
+        db = self._db(fail_on=("u4",))
+        reports = []
+        self.assertFalse(db.execute_many(self.QUERY, [("u%d" % i,) for i in range(7)],
+                                         batch_size=3, on_batch=reports.append))
+        self.assertEqual(self._batches(), [3])
+        self.assertEqual(len(reports), 1)
+        self.assertNotIn("commit", self.conn.log)
+        self.assertEqual(self.conn.log[-1], "rollback")
+        # Not handed out again
+        self.assertFalse(self.conn.open)
+        self.assertEqual(db.pool_stats()["discarded"], 1)
+
+    def test_other_errors_roll_back_and_are_raised(self):
+        db = self._db()
+
+        def on_batch(report):
+            if report["batch"] == 2:
+                raise ValueError("stop")
+        with self.assertRaises(ValueError):
+            db.execute_many(self.QUERY, [("u%d" % i,) for i in range(7)], batch_size=3,
+                            on_batch=on_batch)
+        self.assertEqual(self._batches(), [3, 3])
+        self.assertNotIn("commit", self.conn.log)
+        self.assertEqual(self.conn.log[-1], "rollback")
+
+class BatchWriterTest(DBHandlerTestCase):
+    def _statements(self):
+        return [e[2] for e in self.conn.log if isinstance(e, tuple) and e[0] == "execute"]
+
+    def test_flushes_at_batch_size_and_on_close(self):
+        db = self._db()
+        reports = []
+        with db.batch_writer("drawing_users", ["admin_name", "department"], batch_size=2,
+                             on_batch=reports.append) as writer:
+            for i in range(5):
+                writer.add({"admin_name": "u%d" % i, "department": "QA"})
+            self.assertEqual(len(self._statements()), 2)
+            self.assertNotIn("commit", self.conn.log)
+        statements = self._statements()
+        self.assertEqual([len(p) for p in statements], [4, 4, 2])
+        self.assertEqual(statements[2], ["u4", "QA"])
+        self.assertEqual(self.conn.log[-1], "commit")
+        self.assertEqual((writer.rows, [r["rows"] for r in reports]), (5, [2, 2, 1]))
+        self.assertEqual(db.pool_stats()["idle"], 1)
+
+    def test_failed_batch_rolls_back_and_raises(self):
+        db = self._db(fail_on="u3")
+        with self.assertRaises(pymysql.err.IntegrityError):
+            with db.batch_writer("drawing_users", ["admin_name"], batch_size=2) as writer:
+                for i in range(6):
+                    writer.add(["u%d" % i])
+        self.assertEqual(len(self._statements()), 1)
+        self.assertEqual(writer.rows, 2)
+        self.assertNotIn("commit", self.conn.log)
+        self.assertEqual(self.conn.log[-1], "rollback")
+        self.assertEqual(db.pool_stats()["idle"], 1)
+
+    def test_failed_final_flush_rolls_back_and_raises(self):
+        db = self._db(fail_on="u2")
+        with self.assertRaises(pymysql.err.IntegrityError):
+            with db.batch_writer("drawing_users", ["admin_name"], batch_size=2) as writer:
+                for i in range(3):
+                    writer.add(["u%d" % i])
+        self.assertNotIn("commit", self.conn.log)
+        self.assertEqual(self.conn.log[-1], "rollback")
+        self.assertEqual(db.pool_stats()["leased"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+try:
+    import pymysql
+    from db_handler import QueryCache, read_tables, write_table
+except ImportError:
+    pymysql = None
+
+ROWS = [{"drawing_no": "DRW-001", "status": "Approved"}]
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class QueryCacheTest(unittest.TestCase):
+    def _put(self, cache, query, params=None, tables=("drawings",), rows=ROWS, ttl=None):
+        key = cache.key(query, params)
+        cache.put(key, rows, set(tables), cache.epoch(), ttl)
+        return key
+
+    def test_hit_returns_copies(self):
+        cache = QueryCache()
+        key = self._put(cache, "SELECT *  FROM drawings")
+        rows = cache.get(cache.key("SELECT * FROM\n drawings", None))
+        self.assertEqual(rows, ROWS)
+        rows[0]["status"] = "changed"
+        self.assertEqual(cache.get(key), ROWS)
+
+    def test_params_are_part_of_the_key(self):
+        cache = QueryCache()
+        self._put(cache, "SELECT * FROM drawings WHERE status = %s", ("Approved",))
+        self.assertIsNone(cache.get(cache.key("SELECT * FROM drawings WHERE status = %s", ("Draft",))))
+
+    def test_list_and_dict_params(self):
+        cache = QueryCache()
+        query = "SELECT * FROM drawings WHERE no IN %s"
+        self.assertIsNotNone(self._put(cache, query, (["DRW-001", "DRW-002"],)))
+        self.assertEqual(cache.get(cache.key(query, (["DRW-001", "DRW-002"],))), ROWS)
+        self.assertIsNone(cache.get(cache.key(query, (["DRW-001"],))))
+        self.assertEqual(cache.key("SELECT %(a)s", {"a": [1], "b": 2}),
+                         cache.key("SELECT %(a)s", {"b": 2, "a": [1]}))
+        # Values that can't be hashed at all bypass the cache
+        self.assertIsNone(cache.key(query, (bytearray(b"x"),)))
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_entries=2)
+        a = self._put(cache, "SELECT 1 FROM drawings")
+        b = self._put(cache, "SELECT 2 FROM drawings")
+        cache.get(a)
+        c = self._put(cache, "SELECT 3 FROM drawings")
+        self.assertIsNone(cache.get(b))
+        self.assertIsNotNone(cache.get(a))
+        self.assertIsNotNone(cache.get(c))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl(self):
+        cache = QueryCache(ttl=60)
+        expired = self._put(cache, "SELECT 1 FROM drawings", ttl=0)
+        kept = self._put(cache, "SELECT 2 FROM drawings")
+        self.assertIsNone(cache.get(expired))
+        self.assertIsNotNone(cache.get(kept))
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_large_and_untagged_results_are_not_stored(self):
+        cache = QueryCache(max_rows=1)
+        big = self._put(cache, "SELECT * FROM drawings", rows=ROWS * 2)
+        untagged = self._put(cache, "SELECT NOW()", tables=())
+        self.assertIsNone(cache.get(big))
+        self.assertIsNone(cache.get(untagged))
+
+    def test_invalidate_by_table(self):
+        cache = QueryCache()
+        joined = self._put(cache, "SELECT * FROM drawings JOIN requests", tables=("drawings", "requests"))
+        drawings = self._put(cache, "SELECT * FROM drawings")
+        users = self._put(cache, "SELECT * FROM users", tables=("users",))
+        cache.invalidate("Requests")
+        self.assertIsNone(cache.get(joined))
+        self.assertIsNotNone(cache.get(drawings))
+        cache.invalidate()
+        self.assertIsNone(cache.get(drawings))
+        self.assertIsNone(cache.get(users))
+        self.assertEqual(cache.stats()["tables"], [])
+
+    def test_result_read_before_a_write_is_not_stored(self):
+        cache = QueryCache()
+        key = cache.key("SELECT * FROM drawings", None)
+        epoch = cache.epoch()
+        # A write lands between the read and the put
+        cache.invalidate("drawings")
+        cache.put(key, ROWS, {"drawings"}, epoch)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ROWS, {"drawings"}, cache.epoch())
+        self.assertEqual(cache.get(key), ROWS)
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class TableTagTest(unittest.TestCase):
+    def test_read_tables(self):
+        self.assertEqual(read_tables("SELECT * FROM `Drawings` d JOIN db.requests r ON r.no = d.no "
+                                     "WHERE d.status = 'FROM users'"),
+                         {"drawings", "requests"})
+        self.assertEqual(read_tables("select count(*) from drawings where no in "
+                                     "(select no from requests)"),
+                         {"drawings", "requests"})
+
+    def test_unreliable_reads_are_not_tagged(self):
+        for query in ("SELECT * FROM drawings, requests WHERE drawings.no = requests.no",
+                      "SELECT * FROM drawings FOR UPDATE",
+                      "SELECT * FROM drawings LOCK IN SHARE MODE",
+                      "SELECT NOW()",
+                      "SHOW TABLES"):
+            self.assertIsNone(read_tables(query), query)
+
+    def test_write_table(self):
+        for query in ("INSERT INTO Drawings (no) VALUES (%s)",
+                      "INSERT LOW_PRIORITY IGNORE INTO drawings SET no = %s",
+                      "REPLACE DELAYED INTO drawings VALUES (%s)",
+                      "UPDATE LOW_PRIORITY `drawings` SET status = %s",
+                      "DELETE QUICK FROM db.drawings WHERE no = %s",
+                      "TRUNCATE TABLE drawings"):
+            self.assertEqual(write_table(query), "drawings", query)
+
+    def test_multi_table_writes_are_not_attributed(self):
+        for query in ("UPDATE drawings, requests SET drawings.status = %s",
+                      "UPDATE drawings d JOIN requests r ON r.no = d.no SET d.status = %s",
+                      "DELETE d FROM drawings d JOIN requests r ON r.no = d.no",
+                      "DELETE FROM drawings USING drawings JOIN requests",
+                      "ALTER TABLE drawings ADD COLUMN x INT"):
+            self.assertIsNone(write_table(query), query)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import pymysql
+    from db_handler import QueryStats, query_shape
+except ImportError:
+    pymysql = None
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class QueryShapeTest(unittest.TestCase):
+    def test_literals_and_placeholders(self):
+        self.assertEqual(query_shape("SELECT *\n  FROM drawings WHERE no = 'DRW-001' AND rev > 2"),
+                         "SELECT * FROM drawings WHERE no = ? AND rev > ?")
+        self.assertEqual(query_shape("SELECT * FROM drawings WHERE no = %s AND note = \"it's\""),
+                         "SELECT * FROM drawings WHERE no = ? AND note = ?")
+        # Digits inside identifiers are kept
+        self.assertEqual(query_shape("SELECT col1 FROM t2 LIMIT 10"), "SELECT col1 FROM t2 LIMIT ?")
+
+    def test_lists_collapse(self):
+        self.assertEqual(query_shape("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)"),
+                         query_shape("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)"))
+        self.assertEqual(query_shape("SELECT * FROM t WHERE no IN (%s, %s, %s)"),
+                         "SELECT * FROM t WHERE no IN (...)")
+        self.assertEqual(query_shape("SELECT * FROM t WHERE no in (1,2)"),
+                         "SELECT * FROM t WHERE no IN (...)")
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class QueryStatsTest(unittest.TestCase):
+    QUERY = "SELECT * FROM drawings WHERE no = %s"
+
+    def test_counters_and_histogram(self):
+        stats = QueryStats(slow_log=None)
+        for ms in (0.5, 1, 3, 3, 700, 9000):
+            stats.record(self.QUERY, ms, rows=2, nbytes=10)
+        stats.record("SELECT * FROM drawings WHERE no = 'DRW-001'", 4, error=True)
+        stats.cache_hit(self.QUERY)
+
+        shape = query_shape(self.QUERY)
+        entry = stats.snapshot()[shape]
+        self.assertEqual((entry["calls"], entry["errors"], entry["cache_hits"]), (7, 1, 1))
+        self.assertEqual((entry["rows"], entry["bytes"], entry["max_ms"]), (12, 60, 9000))
+        self.assertEqual(entry["mean_ms"], round(9711.5 / 7, 3))
+        histogram = entry["histogram"]
+        self.assertEqual((histogram["1"], histogram["5"], histogram["1000"], histogram["inf"]),
+                         (2, 3, 1, 1))
+        self.assertEqual(sum(histogram.values()), 7)
+
+    def test_percentiles(self):
+        stats = QueryStats(slow_log=None, keep=100)
+        for ms in range(200, 0, -1):
+            stats.record(self.QUERY, ms)
+        shape = query_shape(self.QUERY)
+        # Only the most recent `keep` timings: 100 down to 1
+        self.assertEqual(stats.percentiles(), {shape: {"p50": 50, "p95": 95, "p99": 99}})
+        self.assertEqual(stats.percentiles("SELECT 1"), {})
+        stats.record("SELECT 1", 7)
+        self.assertEqual(stats.percentiles(query_shape("SELECT 1")),
+                         {"SELECT ?": {"p50": 7, "p95": 7, "p99": 7}})
+
+    def test_shapes_are_capped(self):
+        stats = QueryStats(slow_log=None)
+        stats.MAX_SHAPES = 2
+        for table in ("a", "b", "c", "d"):
+            stats.record("SELECT * FROM %s" % table, 1)
+        self.assertEqual(sorted(stats.snapshot()),
+                         ["(other)", "SELECT * FROM a", "SELECT * FROM b"])
+        self.assertEqual(stats.snapshot()["(other)"]["calls"], 2)
+
+@unittest.skipIf(pymysql is None, "pymysql is not installed")
+class SlowQueryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "slow.log")
+
+    def _stats(self, **kw):
+        stats = QueryStats(slow_log=self.path, **kw)
+
+        def close():
+            if stats._logger is not None:
+                for handler in stats._logger.handlers:
+                    handler.close()
+        self.addCleanup(close)
+        return stats
+
+    def test_only_slow_queries_are_logged(self):
+        stats = self._stats(slow_ms=100)
+        stats.record("SELECT * FROM drawings WHERE no = 'fast'", 99)
+        stats.record("SELECT * FROM drawings WHERE no = %s", 250.25, rows=3, nbytes=42,
+                     error=True)
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn("250.2 ms rows=3 bytes=42", lines[0])
+        self.assertIn(" error | SELECT * FROM drawings WHERE no = %s", lines[0])
+
+    def test_rotates(self):
+        stats = self._stats(slow_ms=0, max_bytes=500, backups=2)
+        for i in range(100):
+            stats.record("SELECT * FROM drawings WHERE no = %s", i)
+        names = sorted(os.listdir(self.dir))
+        self.assertEqual(names, ["slow.log", "slow.log.1", "slow.log.2"])
+        for name in names:
+            self.assertLessEqual(os.path.getsize(os.path.join(self.dir, name)), 500)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertIn("99.0 ms", f.read().splitlines()[-1])
+
+    def test_unwritable_log_is_disabled(self):
+        stats = QueryStats(slow_ms=0, slow_log=os.path.join(self.dir, "missing", "slow.log"))
+        stats.record("SELECT 1", 5)
+        self.assertIsNone(stats.slow_log)
+        self.assertEqual(stats.snapshot()["SELECT ?"]["calls"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+import tkinter as tk
+from array import array
+
+from pages.table_component import CanvasDataTable
+
+STATUSES = ["Approved", "Requested", "Issued"]
+
+def _records(n):
+    return [{"no": "DRW-%03d" % i, "rev": str(i % 4), "status": STATUSES[i % 3]}
+            for i in range(n)]
+
+class Provider(object):
+    columns = {"no": "drawing_no", "rev": "latest_revision", "status": "status"}
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.error = None
+
+    def count(self, query):
+        if self.error:
+            raise self.error
+        return len(self.rows)
+
+    def fetch_page(self, query, after_key, limit, sort=None):
+        if self.error:
+            raise self.error
+        return [dict(r) for r in self.rows[:limit]]
+
+    def key_of(self, record, sort=None):
+        return (record["no"],)
+
+    def invalidate(self):
+        pass
+
+class TableTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.root = tk.Tk()
+        except tk.TclError as e:
+            raise unittest.SkipTest("no display: %s" % e)
+        cls.root.withdraw()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root.destroy()
+
+    def _table(self, **kw):
+        table = CanvasDataTable(self.root, headers=["Drawing ID", "Revision", "Status"],
+                                initial_widths=[200, 100, 140], key_field="no",
+                                search_keys=["no", "status"], **kw)
+        table.data_keys = ["no", "rev", "status"]
+        self.addCleanup(table.destroy)
+        return table
+
+class SortTest(TableTestCase):
+    def test_sort_before_first_load(self):
+        table = self._table()
+        table._toggle_sort(2)
+        self.assertEqual(table.sort_spec, [(2, False)])
+        table._on_data_ready(_records(6))
+        self.assertEqual([table.data.get(i, "status") for i in table.filtered],
+                         ["Approved", "Approved", "Issued", "Issued", "Requested", "Requested"])
+
+    def test_failed_sort_is_not_applied(self):
+        table = self._table()
+        table._on_data_ready(_records(6))
+
+        def fail(subset, spec):
+            raise MemoryError()
+        table.sort_index.order = fail
+        self.assertRaises(MemoryError, table._toggle_sort, 2)
+        self.assertEqual(table.sort_spec, [])
+
+    def test_provider_sorts_only_server_columns(self):
+        provider = Provider([])
+        provider.columns = {"no": "drawing_no", "rev": "latest_revision"}
+        table = self._table(data_provider=provider)
+        self.assertTrue(table._sortable(0))
+        self.assertFalse(table._sortable(2))
+        table._toggle_sort(2)
+        self.assertEqual(table.sort_spec, [])
+
+    def test_streamed_chunks_merge_into_sort_order(self):
+        table = self._table()
+        table._toggle_sort(1)
+        table._toggle_sort(2, additive=True)
+        table._toggle_sort(2, additive=True)
+        records = _records(300)[::-1]
+        table._show_loaded(records[:50])
+        for start in range(50, 300, 50):
+            table._append_rows(records[start:start + 50])
+        shown = list(table.filtered)
+        table.sort_index.reset(table.data)
+        self.assertEqual(shown, list(table.sort_index.order(range(300), table._sort_keys())))
+
+class ProviderTableTest(TableTestCase):
+    def _wait(self, table):
+        deadline = time.monotonic() + 5
+        while table._page_pending and time.monotonic() < deadline:
+            self.root.update()
+            time.sleep(0.01)
+        self.root.update()
+
+    def test_failed_fetch_keeps_the_page(self):
+        provider = Provider(_records(10))
+        table = self._table(data_provider=provider)
+        table.fresh_ttl = 60
+        table.refresh()
+        self._wait(table)
+        self.assertEqual(len(table.data), 10)
+        versions = list(table.data.versions)
+
+        provider.error = IOError("Lost connection to MySQL server during query")
+        table._loaded_at = time.monotonic() - 120
+        table.refresh()
+        self._wait(table)
+        self.assertFalse(table._page_pending)
+        self.assertFalse(table.is_fresh())
+        self.assertEqual(list(table.data.versions), versions)
+        self.assertEqual(table._provider_total, 10)
+
+class KeyedTableTest(TableTestCase):
+    """upsert(), remove() and reconcile() against a full re-sort of the data."""
+
+    def setUp(self):
+        self.table = self._table()
+        self.table._on_data_ready(_records(30))
+
+    def _wait_for_load(self):
+        deadline = time.monotonic() + 5
+        while self.table.is_loading and time.monotonic() < deadline:
+            self.root.update()
+            time.sleep(0.01)
+        self.root.update()
+
+    def _search(self, query):
+        self.table.search_var.set(query)
+        self.table._apply_search()
+
+    def _shown(self):
+        return [self.table.data.get(i, "no") for i in self.table.filtered]
+
+    def _expected(self):
+        # What a fresh search and sort over the current data would show
+        table = self.table
+        rows = table.search_index.search(table._last_query or "", range(len(table.data)))
+        if table.sort_spec:
+            rows = table.sort_index.order(rows, table._sort_keys())
+        return [table.data.get(i, "no") for i in rows]
+
+    def test_descending_sort_is_stable(self):
+        self.table._toggle_sort(2)
+        self.table._toggle_sort(2)
+        self.assertEqual(self.table.sort_spec, [(2, True)])
+        shown = self._shown()
+        self.assertEqual(shown[:3], ["DRW-001", "DRW-004", "DRW-007"])
+        for status in STATUSES:
+            tied = [no for no in shown if self.table.data.get(int(no[4:]), "status") == status]
+            self.assertEqual(tied, sorted(tied))
+
+    def test_upsert_keeps_sort_order(self):
+        self.table._toggle_sort(2)
+        self.table._toggle_sort(2)
+        self.table.upsert("DRW-010", {"status": "Requested"})
+        self.table.upsert("DRW-004", {"status": "Approved"})
+        self.table.upsert("DRW-100", {"rev": "0", "status": "Issued"})
+        self.table.upsert("DRW-000", {"status": "Issued"})
+        self.assertEqual(self._shown(), self._expected())
+        self.assertEqual(self.table.data.get(self.table.filtered[-1], "no"), "DRW-027")
+
+    def test_upsert_moves_rows_in_and_out_of_results(self):
+        self._search("requested")
+        self.table.upsert("DRW-001", {"status": "Issued"})
+        self.table.upsert("DRW-000", {"status": "Requested"})
+        self.table.upsert("DRW-200", {"status": "Requested"})
+        shown = self._shown()
+        self.assertEqual(shown, self._expected())
+        self.assertNotIn("DRW-001", shown)
+        self.assertEqual((shown[0], shown[-1]), ("DRW-000", "DRW-200"))
+
+    def test_key_index_is_kept_current(self):
+        table = self.table
+        self.assertIsNone(table._row_of_key("NOPE"))
+        index = table._key_index
+        table.upsert("DRW-100", {"status": "Issued"})
+        self.assertTrue(table.remove("DRW-003"))
+        self.assertFalse(table.remove("DRW-003"))
+        fresh = [table.data.row(i).to_dict() for i in range(len(table.data))]
+        fresh = [r for r in fresh if r["no"] != "DRW-010"] + [{"no": "DRW-101"}]
+        table.reconcile(fresh)
+        table._append_rows([{"no": "DRW-102"}])
+        self.assertIs(table._key_index, index)
+        for pos in range(len(table.data)):
+            self.assertEqual(table._row_of_key(table.data.get(pos, "no")), pos)
+        self.assertIsNone(table._row_of_key("DRW-010"))
+
+    def test_remove(self):
+        self.table._toggle_sort(0)
+        self.assertTrue(self.table.remove("DRW-005"))
+        self.assertFalse(self.table.remove("DRW-005"))
+        self.assertEqual(self._shown(), self._expected())
+        self.assertEqual(len(self.table.data), 29)
+
+    def test_reconcile(self):
+        self.table._toggle_sort(2)
+        self.table._toggle_sort(2)
+        self._search("drw-0")
+        fresh = _records(30)
+        fresh[3]["status"] = "Requested"
+        fresh[8]["rev"] = "9"
+        del fresh[20]
+        fresh.append({"no": "DRW-050", "rev": "0", "status": "Approved"})
+        fresh.append({"no": "XYZ-001", "rev": "0", "status": "Approved"})
+        versions = dict((self.table.data.get(i, "no"), self.table.data.versions[i])
+                        for i in range(len(self.table.data)))
+
+        inserted, updated, removed = self.table.reconcile(fresh)
+        self.assertEqual(inserted, {"DRW-050", "XYZ-001"})
+        self.assertEqual(updated, {"DRW-003", "DRW-008"})
+        self.assertEqual(removed, {"DRW-020"})
+        self.assertEqual(self._shown(), self._expected())
+        self.assertNotIn("XYZ-001", self._shown())
+        # Untouched rows keep their version stamps
+        for i in range(len(self.table.data)):
+            no = self.table.data.get(i, "no")
+            if no in versions and no not in updated:
+                self.assertEqual(self.table.data.versions[i], versions[no])
+
+    def test_noop_reconcile_keeps_cached_order(self):
+        self.table._toggle_sort(2)
+        sort_index = self.table.sort_index
+        ranks = sort_index.ranks("status")
+        perm = sort_index.permutation((("status", False),))
+        filtered = list(self.table.filtered)
+
+        self.assertEqual(self.table.reconcile(_records(30)), (set(), set(), set()))
+        fresh = _records(30)
+        fresh[4]["rev"] = "9"
+        self.assertEqual(self.table.reconcile(fresh)[1], {"DRW-004"})
+        self.assertIs(sort_index.ranks("status"), ranks)
+        self.assertIs(sort_index.permutation((("status", False),)), perm)
+        self.assertEqual(list(self.table.filtered), filtered)
+
+        # An edit to the sorted column does drop them
+        fresh[4]["status"] = "Issued"
+        self.table.reconcile(fresh)
+        self.assertIsNot(sort_index.ranks("status"), ranks)
+        self.assertEqual(self._shown(), self._expected())
+
+    def test_reconcile_without_sort_keeps_dataset_order(self):
+        fresh = _records(30)[::-1]
+        fresh[0]["status"] = "Issued"
+        self.table.reconcile(fresh)
+        self.assertEqual(self._shown(), ["DRW-%03d" % i for i in range(30)])
+        self.assertEqual(self.table.filtered, array("l", range(30)))
+
+    def test_failed_stream_is_not_reconciled(self):
+        def chunks():
+            yield _records(3)
+            raise IOError("Lost connection to MySQL server during query")
+        self.table.fetch_data_func = chunks
+        self.table.fresh_ttl = 60
+        self.table._loaded_at = time.monotonic() - 120
+        versions = list(self.table.data.versions)
+
+        self.table.refresh()
+        self._wait_for_load()
+        self.assertFalse(self.table.is_loading)
+        self.assertFalse(self.table.is_fresh())
+        self.assertEqual(len(self.table.data), 30)
+        self.assertEqual(list(self.table.data.versions), versions)
+
+if __name__ == "__main__":
+    unittest.main()
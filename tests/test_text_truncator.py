@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pages.table_component import TextTruncator
+
+class StubFont(object):
+    """Fixed-width font metrics, counting the measure() calls."""
+    def __init__(self, char_width):
+        self.char_width = char_width
+        self.calls = 0
+
+    def measure(self, text):
+        self.calls += 1
+        return len(text) * self.char_width
+
+class TextTruncatorTest(unittest.TestCase):
+    def setUp(self):
+        self.narrow, self.wide = StubFont(5), StubFont(10)
+        self.truncator = TextTruncator(None)
+        self.truncator._fonts.update({"narrow": self.narrow, "wide": self.wide})
+
+    def test_empty_string(self):
+        self.assertEqual(self.truncator.truncate("", "narrow", 0), "")
+        self.assertEqual(self.truncator.truncate("", "narrow", 100), "")
+
+    def test_text_that_fits_is_unchanged(self):
+        self.assertEqual(self.truncator.truncate("DRW-001", "narrow", 35), "DRW-001")
+        self.assertEqual(self.truncator.truncate("DRW-001", "narrow", 34), "DRW...")
+
+    def test_cut_to_the_longest_prefix_that_fits(self):
+        # 15px of ellipsis leaves room for 5 of the narrow font's characters
+        self.assertEqual(self.truncator.truncate("Requested by", "narrow", 40), "Reque...")
+        # Trailing spaces before the ellipsis are dropped
+        self.assertEqual(self.truncator.truncate("ab   cdef", "narrow", 40), "ab...")
+
+    def test_width_smaller_than_the_ellipsis(self):
+        self.assertEqual(self.truncator.truncate("DRW-001", "narrow", 15), "...")
+        self.assertEqual(self.truncator.truncate("DRW-001", "narrow", 14), "")
+        self.assertEqual(self.truncator.truncate("DRW-001", "narrow", 0), "")
+
+    def test_caches_are_keyed_by_font(self):
+        truncator = self.truncator
+        self.assertEqual(truncator.measure("narrow", "Approved"), 40)
+        self.assertEqual(truncator.measure("wide", "Approved"), 80)
+        self.assertEqual(truncator.truncate("Approved", "narrow", 50), "Approved")
+        self.assertEqual(truncator.truncate("Approved", "wide", 50), "Ap...")
+
+        calls = (self.narrow.calls, self.wide.calls)
+        self.assertEqual(truncator.measure("narrow", "Approved"), 40)
+        self.assertEqual(truncator.truncate("Approved", "narrow", 50), "Approved")
+        self.assertEqual(truncator.truncate("Approved", "wide", 50), "Ap...")
+        self.assertEqual((self.narrow.calls, self.wide.calls), calls)
+
+if __name__ == "__main__":
+    unittest.main()
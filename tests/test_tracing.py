@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from tracing import NULL_TRACE, Tracer
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "traces.jsonl")
+        self.tracer = Tracer(path=self.path)
+
+    def _lines(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_written_once_its_hold_is_released(self):
+        trace = self.tracer.start("refresh", table="Drawings")
+        trace.hold()
+
+        def work():
+            with self.tracer.bind(trace):
+                with self.tracer.span("fetch", page=0):
+                    time.sleep(0.02)
+        thread = threading.Thread(target=work, name="loader")
+        thread.start()
+        thread.join()
+
+        trace.frame_painted()
+        self.assertFalse(trace.done)
+        self.assertEqual(self._lines(), [])
+
+        trace.release()
+        with self.tracer.span("render"):
+            pass
+        trace.frame_painted()
+        trace.frame_painted()
+        self.assertTrue(trace.done)
+        self.assertIs(self.tracer.current(), NULL_TRACE)
+
+        lines = self._lines()
+        self.assertEqual(len(lines), 1)
+        record = lines[0]
+        self.assertEqual((record["name"], record["status"], record["attrs"]),
+                         ("refresh", "ok", {"table": "Drawings"}))
+        self.assertEqual([s["name"] for s in record["spans"]], ["fetch", "render"])
+        fetch, render = record["spans"]
+        self.assertEqual((fetch["thread"], fetch["attrs"]), ("loader", {"page": 0}))
+        self.assertGreaterEqual(fetch["duration_ms"], 20)
+        # Spans fall in order inside the trace (give or take rounding to 1µs)
+        self.assertGreaterEqual(render["start_ms"] + 0.002, fetch["start_ms"] + fetch["duration_ms"])
+        self.assertGreaterEqual(record["duration_ms"] + 0.002,
+                                render["start_ms"] + render["duration_ms"])
+        self.assertEqual(record["totals_ms"], {"fetch": fetch["duration_ms"],
+                                               "render": render["duration_ms"]})
+
+    def test_superseded_trace_is_written(self):
+        first = self.tracer.start("search")
+        first.hold()
+        second = self.tracer.start("search")
+        second.frame_painted()
+        self.assertEqual([(r["trace"], r["status"]) for r in self._lines()],
+                         [(first.id, "superseded"), (second.id, "ok")])
+        # A late span from the first trace's worker is dropped
+        with first.span("fetch"):
+            pass
+        self.assertEqual(first.spans, [])
+
+    def test_unbound_worker_sees_no_trace(self):
+        self.tracer.start("refresh")
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(self.tracer.current()))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [NULL_TRACE])
+
+    def test_disabled(self):
+        tracer = Tracer(path=self.path, enabled=False)
+        trace = tracer.start("refresh")
+        self.assertIs(trace, NULL_TRACE)
+        with tracer.span("fetch"):
+            pass
+        self.assertEqual(self._lines(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight latency tracing, from a user action to the frame that shows
+its result.
+
+An entry point (Refresh click, search keystroke, page switch...) starts a
+trace; code underneath records spans on whatever trace is current. Work
+handed to a worker thread takes a hold on the trace and binds it in the
+thread, and the trace ends at the first painted frame with no holds left.
+Finished traces are kept in memory and appended to a JSON lines file.
+
+Set DMS_TRACE=0 to switch tracing off, DMS_TRACE_FILE to move the file.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class NullTrace(object):
+    """Stands in when there is no trace, so callers never need to check."""
+    name = None
+    done = True
+
+    def span(self, name, **attrs):
+        return _NULL_SPAN
+
+    def mark(self, name, **attrs):
+        pass
+
+    def hold(self):
+        pass
+
+    def release(self):
+        pass
+
+    def frame_painted(self):
+        pass
+
+    def finish(self, status="ok"):
+        pass
+
+    def __bool__(self):
+        return False
+
+NULL_TRACE = NullTrace()
+
+class _Span(object):
+    __slots__ = ("trace", "name", "attrs", "start")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace._record(self.name, self.start, time.perf_counter(), self.attrs)
+        return False
+
+class Trace(object):
+    MAX_SPANS = 256
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.id = next(tracer._ids)
+        self.name = name
+        self.attrs = attrs
+        self.wall = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.pending = 0
+        self.done = False
+
+    def span(self, name, **attrs):
+        """Context manager timing a block as part of this trace."""
+        return _Span(self, name, attrs)
+
+    def mark(self, name, **attrs):
+        """Records an instant event."""
+        now = time.perf_counter()
+        self._record(name, now, now, attrs)
+
+    def _record(self, name, start, end, attrs):
+        if self.done:
+            return
+        if len(self.spans) >= self.MAX_SPANS:
+            self.dropped += 1
+            return
+        # list.append is atomic, so worker threads can record directly
+        self.spans.append((name, start, end, threading.current_thread().name, attrs))
+
+    def hold(self):
+        """Keeps the trace open until a matching release() (async work)."""
+        self.pending += 1
+
+    def release(self):
+        if self.pending > 0:
+            self.pending -= 1
+
+    def frame_painted(self):
+        """Ends the trace if nothing it is waiting for is still outstanding."""
+        if not self.pending:
+            self.finish()
+
+    def finish(self, status="ok"):
+        if self.done:
+            return
+        self.done = True
+        self.status = status
+        self.duration = time.perf_counter() - self.t0
+        self.tracer._finished(self)
+
+    def to_dict(self):
+        spans, totals = [], {}
+        for name, start, end, thread, attrs in self.spans:
+            ms = (end - start) * 1000
+            totals[name] = totals.get(name, 0.0) + ms
+            span = {"name": name, "start_ms": round((start - self.t0) * 1000, 3),
+                    "duration_ms": round(ms, 3), "thread": thread}
+            if attrs:
+                span["attrs"] = attrs
+            spans.append(span)
+        record = {
+            "trace": self.id,
+            "name": self.name,
+            "time": self.wall,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "totals_ms": dict((k, round(v, 3)) for k, v in totals.items()),
+            "spans": spans,
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.dropped:
+            record["dropped_spans"] = self.dropped
+        return record
+
+class _Binding(object):
+    def __init__(self, local, trace):
+        self.local = local
+        self.trace = trace
+
+    def __enter__(self):
+        self.previous = getattr(self.local, "trace", None)
+        self.local.trace = self.trace
+        return self.trace
+
+    def __exit__(self, *exc):
+        self.local.trace = self.previous
+        return False
+
+class Tracer(object):
+    """
+    Owns the active trace and the output file. The UI thread sees the most
+    recently started trace; other threads only see a trace bound to them.
+    """
+    def __init__(self, path="traces.jsonl", enabled=True,
+                 max_bytes=5 * 1024 * 1024, keep=200):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.recent = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._active = None
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._main = threading.current_thread()
+
+    def start(self, name, **attrs):
+        """Starts a trace for a user action, ending any unfinished one."""
+        if not self.enabled:
+            return NULL_TRACE
+        if self._active is not None:
+            self._active.finish("superseded")
+        self._active = Trace(self, name, attrs)
+        return self._active
+
+    def current(self):
+        trace = getattr(self._local, "trace", None)
+        if trace is None and threading.current_thread() is self._main:
+            trace = self._active
+        if trace is None or trace.done:
+            return NULL_TRACE
+        return trace
+
+    def span(self, name, **attrs):
+        return self.current().span(name, **attrs)
+
+    def bind(self, trace):
+        """Makes trace current in this thread for the duration of a with block."""
+        return _Binding(self._local, trace)
+
+    def _finished(self, trace):
+        if trace is self._active:
+            self._active = None
+        self.recent.append(trace)
+        if self.path:
+            self._write(trace)
+
+    def _write(self, trace):
+        line = json.dumps(trace.to_dict(), default=str) + "\n"
+        with self._write_lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a") as f:
+                    f.write(line)
+            except (IOError, OSError) as e:
+                print("Error writing trace: {}".format(e))
+                self.path = None
+
+tracer = Tracer(path=os.environ.get("DMS_TRACE_FILE", "traces.jsonl"),
+                enabled=os.environ.get("DMS_TRACE", "1") != "0")